@@ -0,0 +1,254 @@
+"""Benchmarks for the ciphers, the Hacker and crypto_utils, saved as JSON to compare revisions
+
+Run from this directory:
+    python benchmark.py --sizes 10,1K,1M --output results.json
+    python benchmark.py --sizes 10,1K,1M --compare results.json
+"""
+import argparse
+import datetime
+import functools
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import crypto_utils
+import instrumentation
+import word_list
+from cryptography import english_alphabet, ascii_alphabet, Caesar, Multiplication, Affine, Unbreakable, RSA, Hacker
+
+ALPHABETS = {"english": english_alphabet, "ascii": ascii_alphabet}
+
+UNITS = {"K": 1000, "M": 1000 ** 2}
+
+
+def parse_size(size):
+    """'10', '1K' or '100M' as a number of characters"""
+    size = size.strip().upper()
+    if size[-1] in UNITS:
+        return int(float(size[:-1]) * UNITS[size[-1]])
+    return int(size)
+
+
+def sample_text(size, alphabet, rng):
+    """<size> characters of dictionary words in the alphabet, separated by spaces where the alphabet has them"""
+    words = word_list.load_english_words().words
+    separator = " " if " " in alphabet else ""
+    pieces = []
+    length = 0
+    while length < size:
+        word = rng.choice(words)
+        if " " not in alphabet:
+            word = word.upper()
+        word = "".join(letter for letter in word if letter in alphabet)
+        pieces.append(word)
+        length += len(word) + len(separator)
+    return separator.join(pieces)[:size]
+
+
+def percentile(values, fraction):
+    """Linear interpolated percentile of a list of numbers"""
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def measure(function, repeats, work, unit):
+    """Times repeated calls of function, then measures its peak traced memory in one extra call"""
+    function()
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        latencies.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    mean = statistics.fmean(latencies)
+    return {"repeats": repeats,
+            "mean_s": mean,
+            "p50_s": percentile(latencies, 0.5),
+            "p90_s": percentile(latencies, 0.9),
+            "p99_s": percentile(latencies, 0.99),
+            "throughput": work / mean if mean > 0 else None,
+            "unit": unit + "/s",
+            "peak_memory_bytes": peak}
+
+
+def repeats_for(size, repeats):
+    """Fewer repeats for large inputs, so that a full run stays within minutes"""
+    if size >= 10 * UNITS["M"]:
+        return 1
+    if size >= UNITS["M"]:
+        return min(repeats, 3)
+    return repeats
+
+
+def cipher_cases(sizes, alphabets, rng, args):
+    """Encode and decode of every cipher for every size and alphabet"""
+    for alphabet_name in alphabets:
+        alphabet = ALPHABETS[alphabet_name]
+        ciphers = [Caesar(alphabet, 7), Multiplication(alphabet, 3), Affine(alphabet, 5, 3),
+                   Unbreakable(alphabet, "".join(rng.choice(alphabet) for _ in range(8)))]
+        rsa = RSA(alphabet, args.rsa_bits)
+        rsa.generate_key()
+        for size in sizes:
+            text = sample_text(size, alphabet, rng)
+            for cipher in ciphers + ([rsa] if size <= args.rsa_max_size else []):
+                encoded = cipher.encode(text)
+                params = {"cipher": cipher.get_name(), "alphabet": alphabet_name, "size": size}
+                yield dict(params, operation="encode"), lambda c=cipher: c.encode(text), size, "chars", {}
+                yield dict(params, operation="decode"), lambda c=cipher, e=encoded: c.decode(e), size, "chars", {}
+
+
+def hack_once(cipher, encoded, alphabet, args):
+    """Hacks encoded with a fresh Hacker, so that no run reuses the key space or ciphers of an earlier one"""
+    return Hacker(None, cipher, encoded, alphabet).hack(args.dictionary_search, args.processes)
+
+
+def hacker_cases(sizes, alphabets, rng, args):
+    """
+    Hacker.hack by a fresh Hacker for every cipher branch and every --hack-sizes size, with whether it recovered the
+    text and the keys it tried in this process, counted in one instrumented run
+    """
+    for alphabet_name in alphabets:
+        alphabet = ALPHABETS[alphabet_name]
+        if " " not in alphabet:
+            # The Hacker scores candidates by space separated dictionary words
+            continue
+        ciphers = [Caesar(alphabet, 7), Multiplication(alphabet, 3), Affine(alphabet, 5, 3),
+                   Unbreakable(alphabet, "".join(rng.choice(alphabet) for _ in range(8)))]
+        for size in sizes:
+            text = sample_text(size, alphabet, rng)
+            for cipher in ciphers:
+                encoded = cipher.encode(text)
+                hack = functools.partial(hack_once, cipher, encoded, alphabet, args)
+                with instrumentation.capture() as report:
+                    recovered = hack() == text
+                params = {"cipher": cipher.get_name(), "alphabet": alphabet_name, "size": size, "operation": "hack"}
+                yield params, hack, size, "chars", {"recovered": recovered,
+                                                    "keys_tried": report.counters["keys_tried"]}
+
+
+def crypto_utils_cases(sizes, rng, args):
+    """Prime generation, RSA key generation and the block conversions"""
+    for bits in args.prime_bits:
+        yield {"function": "generate_random_prime", "bits": bits}, \
+            lambda b=bits: crypto_utils.generate_random_prime(b), 1, "primes", {}
+        yield {"function": "RSA.generate_key", "bits": bits * 2}, \
+            lambda b=bits: RSA(ascii_alphabet, b * 2).generate_key(), 1, "keys", {}
+    block_size = (args.rsa_bits - 1) // 8
+    for size in sizes:
+        text = sample_text(size, ascii_alphabet, rng)
+        blocks = crypto_utils.blocks_from_text(text, block_size)
+        yield {"function": "blocks_from_text", "size": size, "block_size": block_size}, \
+            lambda t=text: crypto_utils.blocks_from_text(t, block_size), size, "chars", {}
+        yield {"function": "text_from_blocks", "size": size, "block_size": block_size}, \
+            lambda b=blocks: crypto_utils.text_from_blocks(b, args.rsa_bits // 2), size, "chars", {}
+        padded = crypto_utils.blocks_from_text(text, block_size, padding=True)
+        yield {"function": "blocks_from_text", "size": size, "block_size": block_size, "padding": True}, \
+            lambda t=text: crypto_utils.blocks_from_text(t, block_size, padding=True), size, "chars", {}
+        yield {"function": "text_from_blocks", "size": size, "block_size": block_size, "padding": True}, \
+            lambda b=padded: crypto_utils.text_from_blocks(b, args.rsa_bits // 2, block_size, padding=True), \
+            size, "chars", {}
+
+
+def revision():
+    """The git commit being benchmarked, if this is a git checkout"""
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def case_key(result):
+    """Identifies a case across runs by its parameters"""
+    return json.dumps(result["case"], sort_keys=True)
+
+
+def compare(results, baseline_path):
+    """Prints the mean latency of every case relative to an earlier results file"""
+    with open(baseline_path) as file:
+        baseline = {case_key(result): result for result in json.load(file)["results"]}
+    for result in results:
+        before = baseline.get(case_key(result))
+        if before is None:
+            continue
+        ratio = result["mean_s"] / before["mean_s"] if before["mean_s"] else float("nan")
+        print("%-90s %8.3fx %s" % (case_key(result), ratio, "slower" if ratio > 1 else "faster"))
+
+
+def main(argv=None):
+    """Runs the selected benchmark groups and writes the JSON report"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10,1K,100K,1M",
+                        help="comma separated input sizes in characters, e.g. 10,1K,1M,100M")
+    parser.add_argument("--alphabets", default="english,ascii", help="comma separated: english, ascii")
+    parser.add_argument("--groups", default="ciphers,hacker,crypto_utils",
+                        help="comma separated: ciphers, hacker, crypto_utils")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--rsa-bits", type=int, default=1024)
+    parser.add_argument("--rsa-max-size", type=parse_size, default=parse_size("100K"))
+    parser.add_argument("--hack-sizes", default="1K,10K",
+                        help="comma separated ciphertext sizes for the Hacker; below ~1K Unbreakable falls back "
+                             "to the much slower dictionary keyword search")
+    parser.add_argument("--prime-bits", default="256,512", help="comma separated prime sizes to generate")
+    parser.add_argument("--dictionary-search", action="store_true", help="hack Unbreakable with dictionary keys")
+    parser.add_argument("--processes", type=int, default=None, help="processes for Hacker key searches")
+    parser.add_argument("--seed", type=int, default=2020)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", default=None, help="earlier results file to compare against")
+    args = parser.parse_args(argv)
+    args.prime_bits = [int(bits) for bits in args.prime_bits.split(",")]
+
+    sizes = [parse_size(size) for size in args.sizes.split(",")]
+    alphabets = args.alphabets.split(",")
+    groups = args.groups.split(",")
+    rng = random.Random(args.seed)
+    random.seed(args.seed)
+
+    cases = []
+    if "ciphers" in groups:
+        cases.append(cipher_cases(sizes, alphabets, rng, args))
+    if "hacker" in groups:
+        cases.append(hacker_cases([parse_size(size) for size in args.hack_sizes.split(",")], alphabets, rng, args))
+    if "crypto_utils" in groups:
+        cases.append(crypto_utils_cases(sizes, rng, args))
+
+    results = []
+    for group in cases:
+        for case, function, work, unit, details in group:
+            result = dict(case=case, **measure(function, repeats_for(case.get("size", 0), args.repeats), work, unit))
+            result.update(details)
+            if "keys_tried" in details:
+                result["keys_per_s"] = details["keys_tried"] / result["mean_s"] if result["mean_s"] > 0 else None
+            results.append(result)
+            print("%-90s %10.6fs %14.1f %s" % (case_key(result), result["mean_s"], result["throughput"] or 0,
+                                               result["unit"]))
+
+    report = {"revision": revision(),
+              "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+              "python": sys.version,
+              "platform": platform.platform(),
+              "arguments": {key: value for key, value in vars(args).items()},
+              "results": results}
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
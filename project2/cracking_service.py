@@ -0,0 +1,428 @@
+"""Asyncio cracking service: jobs hacked on a bounded process pool, with progress, cancellation and timeouts
+
+Run a JSON lines server on a local socket:
+    python cracking_service.py --port 8765 --processes 4
+
+and send it one request per line, for example
+    {"op": "crack", "cipher": "Caesar", "alphabet": "ascii", "text": "...", "timeout": 30}
+    {"op": "status", "job": 1}
+    {"op": "cancel", "job": 1}
+Every crack request is answered with its job's progress lines, the last one with status done, cancelled, timeout or
+failed and, when done, the key and the plaintext.
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import itertools
+import json
+import os
+
+import instrumentation
+import result_cache
+import word_list
+from cryptography import Alphabet, english_alphabet, ascii_alphabet, Caesar, Multiplication, Affine, Unbreakable, \
+    Hacker, search_pool_context
+
+DEFAULT_PORT = 8765
+
+"""Most keys searched in one pool task, so that cancelled jobs free their workers soon"""
+MAX_CHUNK_KEYS = 1024
+
+ALPHABETS = {"english": english_alphabet, "ascii": ascii_alphabet}
+
+CIPHER_NAMES = ("Caesar", "Multiplication", "Affine", "Unbreakable")
+
+"""Job statuses after which nothing changes"""
+FINISHED = ("done", "cancelled", "timeout", "failed")
+
+
+def alphabet_from(value, unknown="drop"):
+    """An Alphabet from a name in ALPHABETS, a string of symbols or a list of symbols"""
+    if isinstance(value, str) and value in ALPHABETS:
+        return ALPHABETS[value].with_unknown(unknown)
+    return Alphabet(value, unknown)
+
+
+def cipher_of_type(name, alphabet):
+    """A cipher of the named type, whose key does not matter, telling a Hacker what to break"""
+    if name == "Caesar":
+        return Caesar(alphabet, 0)
+    elif name == "Multiplication":
+        return Multiplication(alphabet, 1)
+    elif name == "Affine":
+        return Affine(alphabet, 0, 1)
+    elif name == "Unbreakable":
+        return Unbreakable(alphabet, alphabet[0])
+    raise ValueError("Unknown cipher " + repr(name) + ", expected one of " + ", ".join(CIPHER_NAMES))
+
+
+def _job_hacker(cipher_name, alphabet, text, scorer):
+    return Hacker(None, cipher_of_type(cipher_name, alphabet), text, alphabet, scorer)
+
+
+def _counting_keys(function, *args):
+    """function(*args) and the number of keys it tried, counted by instrumentation in the worker"""
+    with instrumentation.capture() as report:
+        result = function(*args)
+    return result, report.counters["keys_tried"]
+
+
+def _hack_plan(cipher_name, alphabet, text, scorer, dictionary_search):
+    """Process pool task: the Hacker's cache fingerprint, its scorer's threshold and the size of its key space"""
+    hacker = _job_hacker(cipher_name, alphabet, text, scorer)
+    return hacker.fingerprint(dictionary_search), hacker.scorer.threshold(text), len(hacker.key_space())
+
+
+def _search_range(cipher_name, alphabet, text, scorer, start, stop, threshold):
+    """Process pool task: Hacker.search_keys over key_space()[start:stop]"""
+    return _job_hacker(cipher_name, alphabet, text, scorer).search_keys(start, stop, threshold)
+
+
+def _best_affine_candidate(cipher_name, alphabet, text, scorer):
+    """Process pool task: Hacker.best_affine_candidate, with the number of keys it tried"""
+    return _counting_keys(_job_hacker(cipher_name, alphabet, text, scorer).best_affine_candidate)
+
+
+def _break_unbreakable(cipher_name, alphabet, text, scorer):
+    """Process pool task: Hacker.break_unbreakable, with the number of keys it tried"""
+    return _counting_keys(_job_hacker(cipher_name, alphabet, text, scorer).break_unbreakable)
+
+
+def _search_plausible_keywords(cipher_name, alphabet, text, scorer, threshold):
+    """Process pool task: Hacker.search_plausible_keywords"""
+    return _job_hacker(cipher_name, alphabet, text, scorer).search_plausible_keywords(threshold)
+
+
+def _decode(cipher_name, alphabet, text, scorer, key):
+    """Process pool task: text decoded with key"""
+    if key is None:
+        return text
+    return _job_hacker(cipher_name, alphabet, text, scorer).candidate_cipher(key).decode(text)
+
+
+class Job:
+    """One ciphertext to hack, with its progress so far"""
+
+    def __init__(self, identifier, cipher_name, alphabet, text, dictionary_search=False, timeout=None):
+        self.id = identifier
+        self.cipher_name = cipher_name
+        self.alphabet = alphabet
+        self.text = text
+        self.dictionary_search = dictionary_search
+        self.timeout = timeout
+        self.status = "queued"
+        self.keys_tried = 0
+        self.keys_total = 0
+        self.best_key = None
+        self.best_score = None
+        self.key = None
+        self.plaintext = None
+        self.error = None
+        self.task = None
+        self.listeners = []
+
+    def record(self, key, score):
+        """Keeps key as the best so far if it scores higher"""
+        if score is not None and (self.best_score is None or score > self.best_score):
+            self.best_key, self.best_score = key, score
+
+    def progress(self):
+        """The job's state as a JSON serializable dict"""
+        progress = {"job": self.id, "status": self.status, "cipher": self.cipher_name,
+                    "keys_tried": self.keys_tried, "keys_total": self.keys_total,
+                    "best_key": self.best_key, "best_score": self.best_score}
+        if self.status == "done":
+            progress["key"] = self.key
+            progress["plaintext"] = self.plaintext
+        elif self.status == "failed":
+            progress["error"] = self.error
+        return progress
+
+    def publish(self):
+        """Sends the current progress to everyone iterating events()"""
+        progress = self.progress()
+        for listener in self.listeners:
+            listener.put_nowait(progress)
+
+    async def events(self):
+        """Yields the job's progress now and after every change, until the job is finished"""
+        listener = asyncio.Queue()
+        self.listeners.append(listener)
+        try:
+            progress = self.progress()
+            while True:
+                yield progress
+                if progress["status"] in FINISHED:
+                    return
+                progress = await listener.get()
+        finally:
+            self.listeners.remove(listener)
+
+    def cancel(self):
+        """Stops the job; key ranges already running in a worker finish, but their results are ignored"""
+        if self.task is not None:
+            self.task.cancel()
+
+    async def wait(self):
+        """Waits for the job to finish, without cancelling it if the waiter is cancelled"""
+        if self.task is not None:
+            await asyncio.shield(self.task)
+        return self
+
+
+class CrackingService:
+    """
+    Runs jobs on a process pool of <processes> workers, at most <max_jobs> of them at a time. Each job's key space is
+    cut into at least processes * chunks_per_process index ranges of at most max_chunk_keys keys, and every job keeps
+    at most <processes> ranges on the pool, so that jobs share the workers and report progress as ranges finish.
+    With a result_cache.ResultCache, repeated ciphertexts are answered without searching.
+    """
+
+    def __init__(self, processes=None, max_jobs=None, chunks_per_process=4, max_chunk_keys=MAX_CHUNK_KEYS,
+                 scorer=None, cache=None):
+        self.processes = processes or os.cpu_count() or 1
+        self.max_jobs = max_jobs or self.processes
+        self.chunks_per_process = chunks_per_process
+        self.max_chunk_keys = max_chunk_keys
+        self.scorer = scorer
+        self.cache = cache
+        self.semaphore = asyncio.Semaphore(self.max_jobs)
+        self.identifiers = itertools.count(1)
+        self.jobs = {}
+        self.executor = None
+
+    def start(self):
+        """Creates the process pool, loading the word list first so that forked workers inherit it"""
+        if self.executor is None:
+            word_list.load_english_words()
+            self.executor = concurrent.futures.ProcessPoolExecutor(self.processes, mp_context=search_pool_context())
+        return self
+
+    async def close(self):
+        """Cancels every unfinished job and shuts the pool down"""
+        tasks = [job.task for job in self.jobs.values() if job.task is not None and not job.task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    async def __aenter__(self):
+        return self.start()
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def submit(self, cipher_name, alphabet, text, dictionary_search=False, timeout=None):
+        """Queues a job and returns it; await job.wait() or iterate job.events() for the result"""
+        if cipher_name not in CIPHER_NAMES:
+            raise ValueError("Unknown cipher " + repr(cipher_name) + ", expected one of " + ", ".join(CIPHER_NAMES))
+        if timeout is not None and (isinstance(timeout, bool) or not isinstance(timeout, (int, float))):
+            raise TypeError("The timeout must be a number of seconds or null, not " + repr(timeout))
+        self.start()
+        job = Job(next(self.identifiers), cipher_name, Alphabet.of(alphabet), text, dictionary_search, timeout)
+        self.jobs[job.id] = job
+        job.task = asyncio.get_running_loop().create_task(self.run(job))
+        return job
+
+    async def run(self, job):
+        """Runs job once a slot is free, recording how it finished"""
+        try:
+            async with self.semaphore:
+                job.status = "running"
+                job.publish()
+                job.key = await asyncio.wait_for(self.crack(job), job.timeout)
+                job.plaintext = await self.call(_decode, job, job.key)
+                job.status = "done"
+        except asyncio.TimeoutError:
+            job.status = "timeout"
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+            job.publish()
+            raise
+        except Exception as error:
+            job.status = "failed"
+            job.error = "%s: %s" % (type(error).__name__, error)
+        job.publish()
+        return job
+
+    def call(self, function, job, *args):
+        """Runs function(job's cipher name, alphabet, text, scorer, *args) on the pool"""
+        return asyncio.get_running_loop().run_in_executor(self.executor, function, job.cipher_name, job.alphabet,
+                                                          job.text, self.scorer, *args)
+
+    async def crack(self, job):
+        """
+        The steps of Hacker.find_key, with the key space searches spread over the pool. The Hacker is only built in
+        the workers, since building one over a new alphabet and sizing its key space would hold up the event loop.
+        """
+        fingerprint, threshold, total = await self.call(_hack_plan, job, job.dictionary_search)
+        if self.cache is not None:
+            entry = self.cache.get(fingerprint)
+            if entry is not None:
+                job.record(*entry)
+                return entry[0]
+
+        final_key = None
+        if job.cipher_name == "Affine":
+            (key, score, accepted), tried = await self.call(_best_affine_candidate, job)
+            job.keys_tried += tried
+            job.keys_total += tried
+            job.record(key, score)
+            job.publish()
+            final_key = key
+            if not accepted:
+                final_key = await self.search(job, total, None)
+        elif job.cipher_name == "Unbreakable":
+            if not job.dictionary_search:
+                final_key, tried = await self.call(_break_unbreakable, job)
+                job.keys_tried += tried
+                job.keys_total += tried
+                job.publish()
+            if final_key is None:
+                pruned = await self.call(_search_plausible_keywords, job, threshold)
+                if pruned is not None:
+                    key, score, accepted, tried = pruned
+                    job.keys_tried += tried
+                    job.keys_total += tried
+                    job.record(key, score)
+                    job.publish()
+                    if accepted:
+                        final_key = key
+                if final_key is None:
+                    final_key = await self.search(job, total, threshold)
+        else:
+            final_key = await self.search(job, total, None)
+            if final_key is None:
+                final_key = 0
+
+        if self.cache is not None:
+            self.cache.put(fingerprint, final_key, job.best_score)
+        return final_key
+
+    async def search(self, job, total, threshold):
+        """
+        Searches the job's key space of <total> keys in index ranges on the pool, publishing progress as each range
+        finishes. Returns the best key overall, or the job's best key so far if the key space is empty.
+        """
+        job.keys_total += total
+        job.publish()
+        chunk = max(1, min(self.max_chunk_keys, -(-total // (self.processes * self.chunks_per_process))))
+        ranges = ((start, min(start + chunk, total)) for start in range(0, total, chunk))
+        loop = asyncio.get_running_loop()
+        pending = {}
+
+        def submit_next():
+            key_range = next(ranges, None)
+            if key_range is not None:
+                future = loop.run_in_executor(self.executor, _search_range, job.cipher_name, job.alphabet, job.text,
+                                              self.scorer, key_range[0], key_range[1], threshold)
+                pending[future] = key_range
+
+        for _ in range(self.processes):
+            submit_next()
+        results = []
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    start, stop = pending.pop(future)
+                    key, score = future.result()
+                    job.keys_tried += stop - start
+                    if score is not None:
+                        results.append((score, -start, key))
+                        job.record(key, score)
+                    submit_next()
+                job.publish()
+                if threshold is not None and job.best_score is not None and job.best_score > threshold:
+                    break
+        finally:
+            for future in pending:
+                future.cancel()
+        if not results:
+            return job.best_key
+        final_score, _, final_key = max(results, key=lambda result: result[:2])
+        if job.best_score is not None and job.best_score > final_score:
+            return job.best_key
+        return final_key
+
+    async def handle_connection(self, reader, writer):
+        """Serves JSON lines requests from one client, streaming the progress of the jobs it submits"""
+        lock = asyncio.Lock()
+        streams = set()
+
+        async def send(message):
+            async with lock:
+                writer.write((json.dumps(message) + "\n").encode('utf_8'))
+                await writer.drain()
+
+        async def stream(job):
+            async for progress in job.events():
+                await send(progress)
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    operation = request.get("op", "crack")
+                    if operation == "crack":
+                        alphabet = alphabet_from(request.get("alphabet", "ascii"), request.get("unknown", "drop"))
+                        job = self.submit(request["cipher"], alphabet, request["text"],
+                                          request.get("dictionary_search", False), request.get("timeout"))
+                        task = asyncio.get_running_loop().create_task(stream(job))
+                        streams.add(task)
+                        task.add_done_callback(streams.discard)
+                    elif operation in ("status", "cancel"):
+                        job = self.jobs.get(request["job"])
+                        if job is None:
+                            raise KeyError("no job " + repr(request["job"]))
+                        if operation == "cancel":
+                            job.cancel()
+                        else:
+                            await send(job.progress())
+                    else:
+                        raise ValueError("Unknown op " + repr(operation))
+                except (ValueError, KeyError, TypeError, AttributeError) as error:
+                    await send({"error": "%s: %s" % (type(error).__name__, error)})
+        except ConnectionError:
+            pass
+        finally:
+            for task in list(streams):
+                task.cancel()
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=DEFAULT_PORT):
+        """Starts the JSON lines server and returns the asyncio server"""
+        self.start()
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+
+async def serve_forever(host, port, processes=None, max_jobs=None, cache_path=None):
+    """Runs a CrackingService server until it is cancelled"""
+    cache = result_cache.ResultCache(path=cache_path) if cache_path else None
+    async with CrackingService(processes, max_jobs, cache=cache) as service:
+        server = await service.serve(host, port)
+        async with server:
+            await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--processes", type=int, default=None, help="worker processes, the core count by default")
+    parser.add_argument("--max-jobs", type=int, default=None, help="jobs running at once, --processes by default")
+    parser.add_argument("--cache", default=None, help="SQLite file remembering recovered keys")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve_forever(args.host, args.port, args.processes, args.max_jobs, args.cache))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
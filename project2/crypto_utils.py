@@ -1,6 +1,11 @@
-import itertools
 import math
 import random
+import secrets
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 __author__ = 'Helge Langseth'
 __version__ = "0.1"
@@ -43,51 +48,253 @@ def modular_inverse(a, m):
     return x % m
 
 
-def blocks_from_text(text, block_size):
+def solve_linear_congruence(a, b, m):
+    """
+    Return every x in [0, m) so that a*x = b (mod m), using the extended Euclidean algorithm.
+    There are gcd(a, m) solutions if the gcd divides b, and none otherwise.
+    :param a: Coefficient -- integer
+    :param b: Right hand side -- integer
+    :param m: Modulus -- positive integer
+    :return: Sorted list of solutions x
+    """
+
+    gcd_value, x, y = extended_gcd(a % m, m)
+    if b % gcd_value != 0:
+        return []
+    step = m // gcd_value
+    first = (x * (b // gcd_value)) % step
+    return [first + t * step for t in range(gcd_value)]
+
+
+# Block sizes up to this many bytes are converted with NumPy, when it is installed
+NUMPY_MAX_BLOCK_SIZE = 8
+
+
+def pad(data, block_size):
+    """
+    ISO/IEC 7816-4 padding: appends a 0x80 byte and then zero bytes up to a multiple of block_size, so that every
+    block is full and the padding can always be removed. Works for any block_size, unlike PKCS#7.
+    :param data: bytes-like object to pad
+    :param block_size: number of bytes per block
+    :return: the padded bytes
+    """
+    return bytes(data) + b"\x80" + bytes(-(len(data) + 1) % block_size)
+
+
+def unpad(data):
+    """
+    Removes the padding added by pad().
+    :param data: padded bytes
+    :return: the bytes given to pad(); raises ValueError if the padding is not valid
+    """
+    stripped = bytes(data).rstrip(b"\0")
+    if not stripped.endswith(b"\x80"):
+        raise ValueError("Invalid block padding")
+    return stripped[:-1]
+
+
+def integers_from_full_blocks(data, block_size):
+    """
+    Converts bytes that are a whole number of blocks to one unsigned big endian integer per block, without copying
+    the blocks: slices of one memoryview for large blocks, and a NumPy matrix product for small ones.
+    :param data: bytes-like object, len(data) must be a multiple of block_size
+    :param block_size: number of bytes per block
+    :return: list of integers
+    """
+    view = memoryview(data).cast('B')
+    if np is not None and block_size <= NUMPY_MAX_BLOCK_SIZE and len(view) >= 64 * block_size:
+        matrix = np.frombuffer(view, dtype=np.uint8).reshape(-1, block_size).astype(np.uint64)
+        weights = np.uint64(256) ** np.arange(block_size - 1, -1, -1, dtype=np.uint64)
+        return (matrix @ weights).tolist()
+    return [int.from_bytes(view[start:start + block_size], 'big') for start in range(0, len(view), block_size)]
+
+
+def bytes_from_full_blocks(blocks, block_size):
+    """
+    Converts integers to block_size big endian bytes each and joins them; the inverse of integers_from_full_blocks.
+    :param blocks: list of integers, each smaller than 256**block_size
+    :param block_size: number of bytes per block
+    :return: bytes
+    """
+    if np is not None and block_size <= NUMPY_MAX_BLOCK_SIZE and len(blocks) >= 64:
+        values = np.array(blocks, dtype=np.uint64)
+        shifts = np.arange(block_size - 1, -1, -1, dtype=np.uint64) * np.uint64(8)
+        return ((values[:, None] >> shifts) & np.uint64(0xFF)).astype(np.uint8).tobytes()
+    return b"".join([block.to_bytes(block_size, 'big') for block in blocks])
+
+
+def blocks_from_bytes(data, block_size, padding=True):
+    """
+    Converts bytes to a list of block integers of block_size bytes each.
+    :param data: bytes-like object
+    :param block_size: number of bytes per block
+    :param padding: pad() the data so that every block is full; without padding the last block may be short, and
+        leading zero bytes of the message are lost when it is converted back
+    :return: list of integers
+    """
+    view = memoryview(data).cast('B')
+    full = len(view) - len(view) % block_size
+    blocks = integers_from_full_blocks(view[:full], block_size)
+    if padding:
+        blocks.extend(integers_from_full_blocks(pad(view[full:], block_size), block_size))
+    elif full < len(view):
+        blocks.append(int.from_bytes(view[full:], 'big'))
+    return blocks
+
+
+def bytes_from_blocks(blocks, block_size, padding=True):
+    """
+    Converts block integers from blocks_from_bytes back to bytes.
+    :param blocks: list of integers, each smaller than 256**block_size
+    :param block_size: number of bytes per block
+    :param padding: whether the blocks were padded; unpadded blocks are written with as few bytes as they need
+    :return: bytes
+    """
+    if padding:
+        return unpad(bytes_from_full_blocks(blocks, block_size))
+    return b"".join([block.to_bytes((block.bit_length() + 7) // 8, 'big') for block in blocks])
+
+
+def iter_blocks_from_bytes(chunks, block_size, padding=True):
+    """
+    Streaming blocks_from_bytes: yields the block integers of an iterable of byte chunks, holding less than one
+    block between chunks, so that a huge message is never in memory at once.
+    :param chunks: iterable of bytes-like objects
+    :param block_size: number of bytes per block
+    :param padding: as for blocks_from_bytes
+    :return: generator of integers
+    """
+    pending = b""
+    for chunk in chunks:
+        data = pending + bytes(chunk) if pending else memoryview(chunk).cast('B')
+        full = len(data) - len(data) % block_size
+        yield from integers_from_full_blocks(data[:full], block_size)
+        pending = bytes(data[full:])
+    yield from blocks_from_bytes(pending, block_size, padding)
+
+
+def iter_bytes_from_blocks(blocks, block_size, padding=True):
+    """
+    Streaming bytes_from_blocks: yields the bytes of each block, holding back the last block to remove its padding.
+    :param blocks: iterable of integers
+    :param block_size: number of bytes per block
+    :param padding: as for bytes_from_blocks
+    :return: generator of bytes
+    """
+    if not padding:
+        for block in blocks:
+            yield block.to_bytes((block.bit_length() + 7) // 8, 'big')
+        return
+    last = None
+    for block in blocks:
+        if last is not None:
+            yield last.to_bytes(block_size, 'big')
+        last = block
+    if last is None:
+        raise ValueError("Padded blocks cannot be empty")
+    yield unpad(last.to_bytes(block_size, 'big'))
+
+
+def blocks_from_text(text, block_size, padding=False):
     """
     Converts a string message to a list of block integers. Each integer
-    represents block_size characters in the text. Don't use too large a block_size, as that will give a *big* integer.
-    Remember that if the generated unsigned int is larger than n in our key the decoding will not be unique.
+    represents block_size bytes of the UTF-8 encoded text. Don't use too large a block_size, as that will give a *big*
+    integer. Remember that if the generated unsigned int is larger than n in our key the decoding will not be unique.
 
     :param text: text message to be translated into blocks
-    :param block_size: number of symbols/characters to be translated into one block
+    :param block_size: number of bytes to be translated into one block
+    :param padding: pad the text so that every block is full, see blocks_from_bytes
     :return: a list of integers; position <i> in the list is the integer representation of the i'th block of symbols
     """
+    return blocks_from_bytes(text.encode('utf_8'), block_size, padding)
 
-    byte_representation = text.encode('utf_8')  # convert the string to bytes
-    _blocks = []
-    for start_position in range(0, len(byte_representation), block_size):
-        this_block = int.from_bytes(byte_representation[start_position: min(start_position + block_size,
-                                                                            len(text))], 'big', signed=False)
-        _blocks.append(this_block)
 
-    return _blocks
-
-
-def text_from_blocks(blocks, no_bits):
+def text_from_blocks(blocks, no_bits, block_size=None, padding=False):
     """
     Converts a list of block integers to the original message string.
-    blocks is the list of integers (generated by a call to blocks_from_text). no_bits is the number of bits
-    used in the encryption, that is the no. bits used when generating the primes for the keys.
+    blocks is the list of integers (generated by a call to blocks_from_text). The bytes of all blocks are joined
+    before they are decoded, so characters split between blocks survive.
 
     :param blocks: a list of unsigned int's; typically the result of encoding the result of blocks_from_text()
-    :param no_bits: the number of bits required to represent the integer in the byte-string
+    :param no_bits: the number of bits used in the encryption; kept for compatibility, the blocks no longer need it
+    :param block_size: the block_size given to blocks_from_text; required with padding
+    :param padding: whether blocks_from_text padded the text
     :return: a string
     """
-    _message = []
-    for this_block in blocks:
-        _message.append(this_block.to_bytes(
-            2 * no_bits, byteorder='big', signed=False).decode(
-            encoding='UTF-8', errors='ignore').lstrip('\0'))
-    return ''.join(_message)
+    if padding:
+        return bytes_from_blocks(blocks, block_size, True).decode('utf_8')
+    return bytes_from_blocks(blocks, block_size, False).decode('utf_8', errors='ignore').lstrip('\0')
 
 
-def rabin_miller_is_prime(n, k=100):
+def primes_below(limit):
+    """
+    Sieve of Eratosthenes.
+    :param limit: Positive integer
+    :return: List of all primes smaller than limit
+    """
+    sieve = bytearray([1]) * limit
+    sieve[:2] = b'\x00\x00'
+    for i in range(2, math.isqrt(limit - 1) + 1):
+        if sieve[i]:
+            sieve[i * i::i] = bytes(len(range(i * i, limit, i)))
+    return [i for i in range(limit) if sieve[i]]
+
+
+# All primes below 10.000, computed once for trial division and candidate sieving
+SMALL_PRIMES = tuple(primes_below(10000))
+
+# The first 13 primes are enough Rabin-Miller bases to decide primality of every n below this bound
+DETERMINISTIC_LIMIT = 3317044064679887385961981
+DETERMINISTIC_BASES = SMALL_PRIMES[:13]
+
+
+def basic_is_prime(_n):
+    """Basic check to see if input is a prime.
+    Returns False if input number is a composite with at least one term being one of the primes below 10.000.
+    Returns True if the number is a prime (can only be known if it is in the list of primes OR if the number is
+    larger than the largest prime in the list and smaller than the square of the last number in the list)
+    Returns None if test is inconclusive (if the number has no factors in the list, and is larger than the square
+    of the last number in the list).
+
+    This code was made by Sahand Saba.
+
+
+    :param _n: number to be tested
+    :return test result: True, False or None
+    """
+    if _n < 2:
+        return False
+    for p in SMALL_PRIMES:
+        if _n % p == 0:
+            return _n == p
+    if _n < 1E8:  # Limit 1E8, because we have all primes below 1E4
+        return True
+    else:
+        return None
+
+
+def witness_count(bits):
+    """
+    Number of random Rabin-Miller witnesses that bound the error probability for a random <bits> bit candidate
+    by 2^-80 (Damgard, Landrock and Pomerance; the table used by OpenSSL's BN_prime_checks_for_size).
+    :param bits: Bit length of the number to test
+    :return: Number of witnesses
+    """
+    for limit, count in ((1300, 2), (850, 3), (650, 4), (550, 5), (450, 6), (400, 7), (350, 8), (300, 9),
+                         (250, 12), (200, 15), (150, 18)):
+        if bits >= limit:
+            return count
+    return 27
+
+
+def rabin_miller_is_prime(n, k=None):
     """
     Test if input is a prime using Rabin-Miller algorithm, with k
     random witness attempts. False return means n is certainly a composite.
     True return value indicates n is *probably* a prime. False positive
     probability is reduced exponentially the larger k gets.
+    Without k, numbers below DETERMINISTIC_LIMIT are tested with the fixed DETERMINISTIC_BASES (an exact answer),
+    and larger numbers with witness_count(bits) random witnesses.
 
     This code was made by Sahand Saba.
 
@@ -97,100 +304,6 @@ def rabin_miller_is_prime(n, k=100):
     :return Outcome of test: True or False
     """
 
-    def basic_is_prime(_n):
-        """Basic check to see if input is a prime.
-        Returns False if input number is a composite with at least one term being one of the primes below 10.000.
-        Returns True if the number is a prime (can only be known if it is in the list of primes OR if the number is
-        larger than the largest prime in the list and smaller than the square of the last number in the list)
-        Returns None if test is inconclusive (if the number has no factors in the list, and is larger than the square
-        of the last number in the list).
-
-        This code was made by Sahand Saba.
-
-
-        :param _n: number to be tested
-        :return test result: True, False or None
-        """
-        if _n < 2:
-            return False
-        for p in [2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41, 43, 47, 53, 59, 61, 67, 71, 73, 79, 83, 89, 97, 101,
-                  103, 107, 109, 113, 127, 131, 137, 139, 149, 151, 157, 163, 167, 173, 179, 181, 191, 193, 197, 199,
-                  211, 223, 227, 229, 233, 239, 241, 251, 257, 263, 269, 271, 277, 281, 283, 293, 307, 311, 313, 317,
-                  331, 337, 347, 349, 353, 359, 367, 373, 379, 383, 389, 397, 401, 409, 419, 421, 431, 433, 439, 443,
-                  449, 457, 461, 463, 467, 479, 487, 491, 499, 503, 509, 521, 523, 541, 547, 557, 563, 569, 571, 577,
-                  587, 593, 599, 601, 607, 613, 617, 619, 631, 641, 643, 647, 653, 659, 661, 673, 677, 683, 691, 701,
-                  709, 719, 727, 733, 739, 743, 751, 757, 761, 769, 773, 787, 797, 809, 811, 821, 823, 827, 829, 839,
-                  853, 857, 859, 863, 877, 881, 883, 887, 907, 911, 919, 929, 937, 941, 947, 953, 967, 971, 977, 983,
-                  991, 997, 1009, 1013, 1019, 1021, 1031, 1033, 1039, 1049, 1051, 1061, 1063, 1069, 1087, 1091, 1093,
-                  1097, 1103, 1109, 1117, 1123, 1129, 1151, 1153, 1163, 1171, 1181, 1187, 1193, 1201, 1213, 1217, 1223,
-                  1229, 1231, 1237, 1249, 1259, 1277, 1279, 1283, 1289, 1291, 1297, 1301, 1303, 1307, 1319, 1321, 1327,
-                  1361, 1367, 1373, 1381, 1399, 1409, 1423, 1427, 1429, 1433, 1439, 1447, 1451, 1453, 1459, 1471, 1481,
-                  1483, 1487, 1489, 1493, 1499, 1511, 1523, 1531, 1543, 1549, 1553, 1559, 1567, 1571, 1579, 1583, 1597,
-                  1601, 1607, 1609, 1613, 1619, 1621, 1627, 1637, 1657, 1663, 1667, 1669, 1693, 1697, 1699, 1709, 1721,
-                  1723, 1733, 1741, 1747, 1753, 1759, 1777, 1783, 1787, 1789, 1801, 1811, 1823, 1831, 1847, 1861, 1867,
-                  1871, 1873, 1877, 1879, 1889, 1901, 1907, 1913, 1931, 1933, 1949, 1951, 1973, 1979, 1987, 1993, 1997,
-                  1999, 2003, 2011, 2017, 2027, 2029, 2039, 2053, 2063, 2069, 2081, 2083, 2087, 2089, 2099, 2111, 2113,
-                  2129, 2131, 2137, 2141, 2143, 2153, 2161, 2179, 2203, 2207, 2213, 2221, 2237, 2239, 2243, 2251, 2267,
-                  2269, 2273, 2281, 2287, 2293, 2297, 2309, 2311, 2333, 2339, 2341, 2347, 2351, 2357, 2371, 2377, 2381,
-                  2383, 2389, 2393, 2399, 2411, 2417, 2423, 2437, 2441, 2447, 2459, 2467, 2473, 2477, 2503, 2521, 2531,
-                  2539, 2543, 2549, 2551, 2557, 2579, 2591, 2593, 2609, 2617, 2621, 2633, 2647, 2657, 2659, 2663, 2671,
-                  2677, 2683, 2687, 2689, 2693, 2699, 2707, 2711, 2713, 2719, 2729, 2731, 2741, 2749, 2753, 2767, 2777,
-                  2789, 2791, 2797, 2801, 2803, 2819, 2833, 2837, 2843, 2851, 2857, 2861, 2879, 2887, 2897, 2903, 2909,
-                  2917, 2927, 2939, 2953, 2957, 2963, 2969, 2971, 2999, 3001, 3011, 3019, 3023, 3037, 3041, 3049, 3061,
-                  3067, 3079, 3083, 3089, 3109, 3119, 3121, 3137, 3163, 3167, 3169, 3181, 3187, 3191, 3203, 3209, 3217,
-                  3221, 3229, 3251, 3253, 3257, 3259, 3271, 3299, 3301, 3307, 3313, 3319, 3323, 3329, 3331, 3343, 3347,
-                  3359, 3361, 3371, 3373, 3389, 3391, 3407, 3413, 3433, 3449, 3457, 3461, 3463, 3467, 3469, 3491, 3499,
-                  3511, 3517, 3527, 3529, 3533, 3539, 3541, 3547, 3557, 3559, 3571, 3581, 3583, 3593, 3607, 3613, 3617,
-                  3623, 3631, 3637, 3643, 3659, 3671, 3673, 3677, 3691, 3697, 3701, 3709, 3719, 3727, 3733, 3739, 3761,
-                  3767, 3769, 3779, 3793, 3797, 3803, 3821, 3823, 3833, 3847, 3851, 3853, 3863, 3877, 3881, 3889, 3907,
-                  3911, 3917, 3919, 3923, 3929, 3931, 3943, 3947, 3967, 3989, 4001, 4003, 4007, 4013, 4019, 4021, 4027,
-                  4049, 4051, 4057, 4073, 4079, 4091, 4093, 4099, 4111, 4127, 4129, 4133, 4139, 4153, 4157, 4159, 4177,
-                  4201, 4211, 4217, 4219, 4229, 4231, 4241, 4243, 4253, 4259, 4261, 4271, 4273, 4283, 4289, 4297, 4327,
-                  4337, 4339, 4349, 4357, 4363, 4373, 4391, 4397, 4409, 4421, 4423, 4441, 4447, 4451, 4457, 4463, 4481,
-                  4483, 4493, 4507, 4513, 4517, 4519, 4523, 4547, 4549, 4561, 4567, 4583, 4591, 4597, 4603, 4621, 4637,
-                  4639, 4643, 4649, 4651, 4657, 4663, 4673, 4679, 4691, 4703, 4721, 4723, 4729, 4733, 4751, 4759, 4783,
-                  4787, 4789, 4793, 4799, 4801, 4813, 4817, 4831, 4861, 4871, 4877, 4889, 4903, 4909, 4919, 4931, 4933,
-                  4937, 4943, 4951, 4957, 4967, 4969, 4973, 4987, 4993, 4999, 5003, 5009, 5011, 5021, 5023, 5039, 5051,
-                  5059, 5077, 5081, 5087, 5099, 5101, 5107, 5113, 5119, 5147, 5153, 5167, 5171, 5179, 5189, 5197, 5209,
-                  5227, 5231, 5233, 5237, 5261, 5273, 5279, 5281, 5297, 5303, 5309, 5323, 5333, 5347, 5351, 5381, 5387,
-                  5393, 5399, 5407, 5413, 5417, 5419, 5431, 5437, 5441, 5443, 5449, 5471, 5477, 5479, 5483, 5501, 5503,
-                  5507, 5519, 5521, 5527, 5531, 5557, 5563, 5569, 5573, 5581, 5591, 5623, 5639, 5641, 5647, 5651, 5653,
-                  5657, 5659, 5669, 5683, 5689, 5693, 5701, 5711, 5717, 5737, 5741, 5743, 5749, 5779, 5783, 5791, 5801,
-                  5807, 5813, 5821, 5827, 5839, 5843, 5849, 5851, 5857, 5861, 5867, 5869, 5879, 5881, 5897, 5903, 5923,
-                  5927, 5939, 5953, 5981, 5987, 6007, 6011, 6029, 6037, 6043, 6047, 6053, 6067, 6073, 6079, 6089, 6091,
-                  6101, 6113, 6121, 6131, 6133, 6143, 6151, 6163, 6173, 6197, 6199, 6203, 6211, 6217, 6221, 6229, 6247,
-                  6257, 6263, 6269, 6271, 6277, 6287, 6299, 6301, 6311, 6317, 6323, 6329, 6337, 6343, 6353, 6359, 6361,
-                  6367, 6373, 6379, 6389, 6397, 6421, 6427, 6449, 6451, 6469, 6473, 6481, 6491, 6521, 6529, 6547, 6551,
-                  6553, 6563, 6569, 6571, 6577, 6581, 6599, 6607, 6619, 6637, 6653, 6659, 6661, 6673, 6679, 6689, 6691,
-                  6701, 6703, 6709, 6719, 6733, 6737, 6761, 6763, 6779, 6781, 6791, 6793, 6803, 6823, 6827, 6829, 6833,
-                  6841, 6857, 6863, 6869, 6871, 6883, 6899, 6907, 6911, 6917, 6947, 6949, 6959, 6961, 6967, 6971, 6977,
-                  6983, 6991, 6997, 7001, 7013, 7019, 7027, 7039, 7043, 7057, 7069, 7079, 7103, 7109, 7121, 7127, 7129,
-                  7151, 7159, 7177, 7187, 7193, 7207, 7211, 7213, 7219, 7229, 7237, 7243, 7247, 7253, 7283, 7297, 7307,
-                  7309, 7321, 7331, 7333, 7349, 7351, 7369, 7393, 7411, 7417, 7433, 7451, 7457, 7459, 7477, 7481, 7487,
-                  7489, 7499, 7507, 7517, 7523, 7529, 7537, 7541, 7547, 7549, 7559, 7561, 7573, 7577, 7583, 7589, 7591,
-                  7603, 7607, 7621, 7639, 7643, 7649, 7669, 7673, 7681, 7687, 7691, 7699, 7703, 7717, 7723, 7727, 7741,
-                  7753, 7757, 7759, 7789, 7793, 7817, 7823, 7829, 7841, 7853, 7867, 7873, 7877, 7879, 7883, 7901, 7907,
-                  7919, 7927, 7933, 7937, 7949, 7951, 7963, 7993, 8009, 8011, 8017, 8039, 8053, 8059, 8069, 8081, 8087,
-                  8089, 8093, 8101, 8111, 8117, 8123, 8147, 8161, 8167, 8171, 8179, 8191, 8209, 8219, 8221, 8231, 8233,
-                  8237, 8243, 8263, 8269, 8273, 8287, 8291, 8293, 8297, 8311, 8317, 8329, 8353, 8363, 8369, 8377, 8387,
-                  8389, 8419, 8423, 8429, 8431, 8443, 8447, 8461, 8467, 8501, 8513, 8521, 8527, 8537, 8539, 8543, 8563,
-                  8573, 8581, 8597, 8599, 8609, 8623, 8627, 8629, 8641, 8647, 8663, 8669, 8677, 8681, 8689, 8693, 8699,
-                  8707, 8713, 8719, 8731, 8737, 8741, 8747, 8753, 8761, 8779, 8783, 8803, 8807, 8819, 8821, 8831, 8837,
-                  8839, 8849, 8861, 8863, 8867, 8887, 8893, 8923, 8929, 8933, 8941, 8951, 8963, 8969, 8971, 8999, 9001,
-                  9007, 9011, 9013, 9029, 9041, 9043, 9049, 9059, 9067, 9091, 9103, 9109, 9127, 9133, 9137, 9151, 9157,
-                  9161, 9173, 9181, 9187, 9199, 9203, 9209, 9221, 9227, 9239, 9241, 9257, 9277, 9281, 9283, 9293, 9311,
-                  9319, 9323, 9337, 9341, 9343, 9349, 9371, 9377, 9391, 9397, 9403, 9413, 9419, 9421, 9431, 9433, 9437,
-                  9439, 9461, 9463, 9467, 9473, 9479, 9491, 9497, 9511, 9521, 9533, 9539, 9547, 9551, 9587, 9601, 9613,
-                  9619, 9623, 9629, 9631, 9643, 9649, 9661, 9677, 9679, 9689, 9697, 9719, 9721, 9733, 9739, 9743, 9749,
-                  9767, 9769, 9781, 9787, 9791, 9803, 9811, 9817, 9829, 9833, 9839, 9851, 9857, 9859, 9871, 9883, 9887,
-                  9901, 9907, 9923, 9929, 9931, 9941, 9949, 9967, 9973]:
-            if _n % p == 0:
-                return _n == p
-        if _n < 1E8:  # Limit 1E8, because we have all primes below 1E4
-            return True
-        else:
-            return None
-
     b = basic_is_prime(n)
     if b is not None:
         # Basic test gave answer
@@ -201,6 +314,24 @@ def rabin_miller_is_prime(n, k=100):
     while m % 2 == 0:
         s += 1
         m //= 2
+
+    def is_witness(x):
+        xi = pow(x, m, n)
+        if xi == 1 or xi == n - 1:
+            return False
+        for __ in range(s - 1):
+            xi = pow(xi, 2, n)
+            if xi == n - 1:
+                return False
+            elif xi == 1:
+                return True
+        return True
+
+    if k is None:
+        if n < DETERMINISTIC_LIMIT:
+            return not any(is_witness(x) for x in DETERMINISTIC_BASES)
+        k = witness_count(n.bit_length())
+
     liars = set()
 
     def get_new_x():
@@ -210,48 +341,48 @@ def rabin_miller_is_prime(n, k=100):
         x = get_new_x()
         while x in liars:
             x = get_new_x()
-        xi = pow(x, m, n)
-        witness = True
-        if xi == 1 or xi == n - 1:
-            witness = False
-        else:
-            for __ in range(s - 1):
-                xi = (xi ** 2) % n
-                if xi == 1:
-                    return False
-                elif xi == n - 1:
-                    witness = False
-                    break
-            xi = (xi ** 2) % n
-            if xi != 1:
-                return False
-        if witness:
+        if is_witness(x):
             return False
-        else:
-            liars.add(x)
+        liars.add(x)
     return True
 
 
-def generate_random_prime(bits, prime_test=rabin_miller_is_prime):
+def sieve_candidates(start, count):
+    """
+    Sieve the window of odd numbers start, start + 2, ..., start + 2 * (count - 1) with SMALL_PRIMES.
+    :param start: Odd positive integer
+    :param count: Number of odd numbers in the window
+    :return: The numbers in the window that have no factor among SMALL_PRIMES (apart from being one of them)
+    """
+    survivors = bytearray([1]) * count
+    for p in SMALL_PRIMES[1:]:
+        # Index i of the first multiple of p in the window: start + 2 * i = 0 (mod p)
+        i = (-start * ((p + 1) // 2)) % p
+        if start + 2 * i == p:
+            i += p
+        survivors[i::p] = bytes(len(range(i, count, p)))
+    return [start + 2 * i for i in range(count) if survivors[i]]
+
+
+def generate_random_prime(bits, prime_test=rabin_miller_is_prime, top_bits=1):
     """
     Generate random prime number with given number of bits.
+    Each random starting point is followed by a window of <bits * 2> odd numbers which is first sieved with
+    SMALL_PRIMES, so that prime_test only runs on the candidates without small factors.
     :param bits: number of bits. The end-product actually has <(bits+1)< bits; the first <bits> bits are
-        "random"; the final bit is a '1' to make sure it is an odd number.
+        "random", drawn from the secrets module so that seeding random cannot reproduce a key; the final bit is a
+        '1' to make sure it is an odd number.
     :param prime_test: the test function to use to check if a generated number is indeed prime
+    :param top_bits: number of leading bits set to '1'; with 2, the product of two such primes has exactly the sum
+        of their lengths in bits, as an RSA modulus should
     :return: a prime of the correct length
 
     This code was made by Sahand Saba.
     """
     def get_random_t():
-        return random.getrandbits(bits) | 1 << bits | 1
-
-    p = get_random_t()
-    for i in itertools.count(1):
-        if prime_test(p):
-            return p
-        else:
-            if i % (bits * 2) == 0:
-                p = get_random_t()
-            else:
-                p += 2  # Add 2 since we are only interested in odd numbers
+        return secrets.randbits(bits) | ((1 << top_bits) - 1) << (bits + 1 - top_bits) | 1
 
+    while True:
+        for p in sieve_candidates(get_random_t(), bits * 2):
+            if prime_test(p):
+                return p
@@ -1,12 +1,136 @@
 """Different subclasses of ciphers and subclasses of persons"""
-import random
+import codecs
+import concurrent.futures
+import copy
+import functools
+import io
+import itertools
+import math
+import mmap
+import multiprocessing
+import string
+from collections import Counter
 import crypto_utils
-
-english_alphabet = ["A", "B", "C", "D", "E", "F", "G", "H", "I", "J", "K", "L",
+import instrumentation
+import key_pool
+import result_cache
+import scoring
+import vectorized
+import word_list
+
+"""What a cipher does with characters outside its alphabet"""
+UNKNOWN_POLICIES = ("drop", "keep", "error")
+
+
+class Alphabet:
+    """
+    Immutable sequence of symbols with O(1) symbol -> index lookup, its size, and its units (the multipliers with
+    an inverse mod size) together with their inverses, computed once per alphabet.
+    unknown is the policy for characters outside the alphabet: "drop" them, "keep" them unchanged or raise an
+    "error".
+    """
+
+    __slots__ = ("symbols", "indices", "size", "units", "inverses", "unknown")
+
+    def __init__(self, symbols, unknown="drop"):
+        if unknown not in UNKNOWN_POLICIES:
+            raise ValueError("unknown must be one of " + ", ".join(UNKNOWN_POLICIES))
+        symbols = tuple(symbols)
+        indices = {symbol: index for index, symbol in enumerate(symbols)}
+        if len(indices) != len(symbols):
+            raise ValueError("Alphabet symbols must be unique")
+        size = len(symbols)
+        units = tuple(unit for unit in range(size) if math.gcd(unit, size) == 1)
+        set_slot = super().__setattr__
+        set_slot("symbols", symbols)
+        set_slot("indices", indices)
+        set_slot("size", size)
+        set_slot("units", units)
+        set_slot("inverses", {unit: crypto_utils.modular_inverse(unit, size) for unit in units})
+        set_slot("unknown", unknown)
+
+    @classmethod
+    def of(cls, alphabet):
+        """alphabet itself if it is an Alphabet, otherwise an Alphabet of its symbols"""
+        return alphabet if isinstance(alphabet, cls) else cls(alphabet)
+
+    def with_unknown(self, unknown):
+        """The same symbols with another policy for characters outside the alphabet"""
+        return self if unknown == self.unknown else Alphabet(self.symbols, unknown)
+
+    def index(self, symbol):
+        try:
+            return self.indices[symbol]
+        except KeyError:
+            raise ValueError("%r is not in the alphabet" % (symbol,)) from None
+
+    def inverse(self, multiplier):
+        """Inverse of multiplier mod size, or what modular_inverse makes of a multiplier that has none"""
+        inverse = self.inverses.get(multiplier % self.size) if self.size else None
+        if inverse is None:
+            return crypto_utils.modular_inverse(multiplier, self.size)
+        return inverse
+
+    def table(self):
+        """An empty translation table applying the unknown policy"""
+        return TranslationTable(self.unknown)
+
+    def byte_symbols(self):
+        """The symbols as bytes, for bytes mode, which needs every symbol to be one character below 256"""
+        try:
+            symbols = "".join(self.symbols).encode('latin_1')
+        except UnicodeEncodeError:
+            symbols = None
+        if symbols is None or len(symbols) != self.size:
+            raise ValueError("Bytes mode needs an alphabet of single characters below 256")
+        return symbols
+
+    def unknown_bytes(self):
+        """The byte values outside the alphabet"""
+        return bytes(range(256)).translate(None, self.byte_symbols())
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Alphabet is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("Alphabet is immutable")
+
+    def __reduce__(self):
+        return Alphabet, (self.symbols, self.unknown)
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        return self.symbols[index]
+
+    def __iter__(self):
+        return iter(self.symbols)
+
+    def __contains__(self, symbol):
+        return symbol in self.indices
+
+    def __eq__(self, other):
+        """Only alphabets are equal to alphabets, since the hash includes the unknown policy"""
+        if isinstance(other, Alphabet):
+            return self.symbols == other.symbols and self.unknown == other.unknown
+        return NotImplemented
+
+    def __hash__(self):
+        return hash((self.symbols, self.unknown))
+
+    def __repr__(self):
+        return "Alphabet(%r, unknown=%r)" % ("".join(self.symbols), self.unknown)
+
+
+"""Every byte value, as the latin-1 characters, for ciphers over arbitrary binary data in bytes mode"""
+byte_alphabet = Alphabet([chr(code) for code in range(256)])
+
+english_alphabet = Alphabet(["A", "B", "C", "D", "E", "F", "G", "H", "I", "J", "K", "L",
                     "M", "N", "O", "P", "Q", "R", "S", "T", "U", "V", "W", "X",
-                    "Y", "Z"]
+                    "Y", "Z"])
 
-ascii_alphabet = [" ", "!", '"', "#", "$", "%", "&", "'", "(", ")", "*", "+",
+ascii_alphabet = Alphabet([" ", "!", '"', "#", "$", "%", "&", "'", "(", ")", "*", "+",
                   ",", "-", ".", "/", "0", "1", "2", "3", "4", "5", "6", "7",
                   "8", "9", ":", ";", "<", "=", ">", "?", "@",
                   "A", "B", "C", "D", "E", "F", "G", "H", "I", "J", "K", "L",
@@ -14,14 +138,74 @@ ascii_alphabet = [" ", "!", '"', "#", "$", "%", "&", "'", "(", ")", "*", "+",
                   "Y", "Z",
                   "[", "]", "^", "_", "`", "a", "b", "c", "d", "e", "f", "g", "h",
                   "i", "j", "k", "l", "m", "n", "o", "p", "q", "r", "s", "t",
-                  "u", "v", "w", "x", "y", "z", "{", "|", "}", "~"]
+                  "u", "v", "w", "x", "y", "z", "{", "|", "}", "~"])
+
+english_frequency_order = " etaoinshrdlcumwfgypbvkjxqz"
+
+CANDIDATE_CACHE_SIZE = 4096
+
+"""Characters read per chunk when streaming"""
+CHUNK_SIZE = 1 << 16
+
+english_symbol_frequencies = {" ": 18.3, "a": 8.167, "b": 1.492, "c": 2.782, "d": 4.253, "e": 12.702, "f": 2.228,
+                              "g": 2.015, "h": 6.094, "i": 6.966, "j": 0.153, "k": 0.772, "l": 4.025, "m": 2.406,
+                              "n": 6.749, "o": 7.507, "p": 1.929, "q": 0.095, "r": 5.987, "s": 6.327, "t": 9.056,
+                              "u": 2.758, "v": 0.978, "w": 2.360, "x": 0.150, "y": 1.974, "z": 0.074}
+
+
+class TranslationTable(dict):
+    """Character mapping for str.translate applying an unknown policy to characters outside the alphabet"""
+
+    def __init__(self, unknown="drop"):
+        super().__init__()
+        self.unknown = unknown
+
+    def __missing__(self, key):
+        if self.unknown == "drop":
+            return None
+        if self.unknown == "keep":
+            """str.translate leaves characters that raise LookupError unchanged"""
+            raise LookupError(key)
+        raise ValueError("%r is not in the alphabet" % chr(key))
 
 
 class Cipher:
     """Has implementations of various ciphers as subclass"""
 
     def __init__(self, alphabet):
-        self.alphabet = alphabet
+        self.alphabet = Alphabet.of(alphabet)
+        self.byte_tables = None
+
+    def build_table(self, index_function):
+        """Compiles index -> index_function(index) into a translation table over the alphabet"""
+        size = len(self.alphabet)
+        table = self.alphabet.table()
+        for index, letter in enumerate(self.alphabet):
+            table[ord(letter)] = self.alphabet[index_function(index) % size]
+        return table
+
+    @classmethod
+    def key_space(cls, alphabet):
+        """Every valid key of this cipher type over alphabet, in search order"""
+        return ()
+
+    @classmethod
+    def from_key(cls, alphabet, key):
+        """A cipher of this type using a key from key_space"""
+        return cls(alphabet, key)
+
+    def keystream(self):
+        """
+        (multiplier, offsets) if this cipher maps the index at position i to multiplier * index + offsets[i % period],
+        so that a Pipeline can fold it into its neighbours, otherwise None
+        """
+        return None
+
+    def __or__(self, other):
+        """A Pipeline encoding with this cipher, then with other"""
+        if not isinstance(other, Cipher):
+            return NotImplemented
+        return Pipeline([self, other])
 
     def encode(self, text):
         return text
@@ -29,11 +213,136 @@ class Cipher:
     def decode(self, text):
         return text
 
+    def build_byte_table(self, table):
+        """A 256 byte table for bytes.translate with the mapping of a translation table, other bytes unchanged"""
+        byte_table = bytearray(range(256))
+        for code, letter in table.items():
+            byte_table[code] = ord(letter)
+        return bytes(byte_table)
+
+    def get_byte_tables(self):
+        """(encode table, decode table, bytes outside the alphabet) for bytes mode, built on first use"""
+        if self.byte_tables is None:
+            unknown_bytes = self.alphabet.unknown_bytes()
+            if hasattr(self, "encode_table"):
+                self.byte_tables = (self.build_byte_table(self.encode_table),
+                                    self.build_byte_table(self.decode_table), unknown_bytes)
+            else:
+                self.byte_tables = (None, None, unknown_bytes)
+        return self.byte_tables
+
+    def encode_bytes(self, data, out=None):
+        """
+        Encodes any bytes-like object over a byte alphabet (see byte_alphabet). Returns bytes, or writes into the
+        writable buffer out and returns the number of bytes written.
+        """
+        table, _, unknown_bytes = self.get_byte_tables()
+        return self.translate_bytes(table, unknown_bytes, data, out)
+
+    def decode_bytes(self, data, out=None):
+        """Decodes any bytes-like object over a byte alphabet, like encode_bytes"""
+        _, table, unknown_bytes = self.get_byte_tables()
+        return self.translate_bytes(table, unknown_bytes, data, out)
+
+    def translate_bytes(self, table, unknown_bytes, data, out):
+        """data.translate(table) under the alphabet's unknown policy, returned or written into out"""
+        data = as_bytes(data)
+        if table is None:
+            """The plain Cipher leaves text unchanged"""
+            return write_bytes(data, out)
+        unknown = self.alphabet.unknown
+        if unknown != "keep" and unknown_bytes and len(data.translate(None, unknown_bytes)) != len(data):
+            if unknown == "error":
+                raise ValueError("The data has bytes outside the alphabet")
+            return write_bytes(data.translate(table, unknown_bytes), out)
+        return write_bytes(data.translate(table), out)
+
+    def encode_chunk(self, text, position):
+        """Encodes a piece of a longer message that starts <position> characters into it"""
+        return self.encode(text)
+
+    def decode_chunk(self, text, position):
+        """Decodes a piece of a longer message that starts <position> characters into it"""
+        return self.decode(text)
+
+    def chunk_transforms(self, encode):
+        """The transform(chunk, position) steps a stream runs through in turn, each counting its own input"""
+        return [self.encode_chunk if encode else self.decode_chunk]
+
+    def encode_stream(self, source, destination, chunk_size=CHUNK_SIZE):
+        """Encodes source into destination chunk by chunk and returns the number of characters read"""
+        return self.transform_stream(chain_transforms(self.chunk_transforms(True)), source, destination, chunk_size)
+
+    def decode_stream(self, source, destination, chunk_size=CHUNK_SIZE):
+        """Decodes source into destination chunk by chunk and returns the number of characters read"""
+        return self.transform_stream(chain_transforms(self.chunk_transforms(False)), source, destination, chunk_size)
+
+    @staticmethod
+    def transform_stream(transform, source, destination, chunk_size):
+        """
+        Writes transform(chunk, position) for every chunk of source to destination, holding one chunk at a time.
+        source is a text or binary file object, an mmap or an iterable of str or bytes; bytes are read as UTF-8.
+        destination is a text or binary file object or an mmap, and gets UTF-8 if it is binary.
+        """
+        binary = isinstance(destination, (io.RawIOBase, io.BufferedIOBase, mmap.mmap))
+        if hasattr(source, "read"):
+            chunks = iter(lambda: source.read(chunk_size), source.read(0))
+        else:
+            chunks = iter(source)
+        decoder = codecs.getincrementaldecoder('utf_8')()
+        position = 0
+        for chunk in chunks:
+            if not isinstance(chunk, str):
+                chunk = decoder.decode(chunk)
+            output = transform(chunk, position)
+            destination.write(output.encode('utf_8') if binary else output)
+            position += len(chunk)
+        chunk = decoder.decode(b"", final=True)
+        output = transform(chunk, position)
+        destination.write(output.encode('utf_8') if binary else output)
+        return position + len(chunk)
+
     def verify(self):
         if not self.decode(self.encode("CODE")) == "CODE":
             raise Exception
 
 
+def chain_transforms(transforms):
+    """
+    transform(chunk, position) running the chunk through transforms in turn, giving each the position in the text
+    that reaches it, which falls behind the stream position once an earlier step drops characters
+    """
+    if len(transforms) == 1:
+        return transforms[0]
+    positions = [0] * len(transforms)
+
+    def transform(text, position):
+        for index, step in enumerate(transforms):
+            length = len(text)
+            text = step(text, positions[index])
+            positions[index] += length
+        return text
+    return transform
+
+
+def as_bytes(data):
+    """bytes or bytearray as they are, any other bytes-like object copied into bytes"""
+    if isinstance(data, (bytes, bytearray)):
+        return data
+    return memoryview(data).tobytes()
+
+
+def write_bytes(result, out):
+    """result itself if out is None, otherwise the number of bytes of result copied into the start of out"""
+    if out is None:
+        return bytes(result)
+    view = memoryview(out).cast('B')
+    if len(view) < len(result):
+        raise ValueError("out holds %d bytes, the result needs %d" % (len(view), len(result)))
+    view[:len(result)] = result
+    return len(result)
+
+
 class Caesar(Cipher):
     """Substitutes letters with a static integer"""
 
@@ -41,28 +350,25 @@ class Caesar(Cipher):
         super().__init__(alphabet)
         self.integer = integer
         self.name = "Caesar"
+        self.encode_table = self.build_table(lambda index: index + self.integer)
+        self.decode_table = self.build_table(lambda index: index - self.integer)
+
+    @classmethod
+    def key_space(cls, alphabet):
+        """Every shift, 0 included"""
+        return range(len(alphabet))
+
+    def keystream(self):
+        return 1, [self.integer]
 
     def get_name(self):
         return self.name
 
     def encode(self, text):
-        encoded_text = ""
-        for character in text:
-            for letter in range(len(self.alphabet)):
-                if character == self.alphabet[letter]:
-                    index = (letter + self.integer) % len(self.alphabet)
-                    encoded_text += self.alphabet[index]
-        return encoded_text
+        return text.translate(self.encode_table)
 
     def decode(self, text):
-        decoded_text = ""
-        for character in text:
-            for letter in range(len(self.alphabet)):
-                if character == self.alphabet[letter]:
-                    index = (letter - self.integer) % len(self.alphabet)
-                    decoded_text += self.alphabet[index]
-
-        return decoded_text
+        return text.translate(self.decode_table)
 
     def verify(self):
         if not self.decode(self.encode("CODE")) == "CODE":
@@ -76,29 +382,26 @@ class Multiplication(Cipher):
         super().__init__(alphabet)
         self.integer = integer
         self.name = "Multiplication"
+        inverse = self.alphabet.inverse(self.integer)
+        self.encode_table = self.build_table(lambda index: index * self.integer)
+        self.decode_table = self.build_table(lambda index: index * inverse)
+
+    @classmethod
+    def key_space(cls, alphabet):
+        """The units mod len(alphabet), the only multipliers that can be decoded"""
+        return Alphabet.of(alphabet).units
+
+    def keystream(self):
+        return self.integer, [0]
 
     def get_name(self):
         return self.name
 
     def encode(self, text):
-        encoded_text = ""
-        for character in text:
-            for letter in range(len(self.alphabet)):
-                if character == self.alphabet[letter]:
-                    index = (letter * self.integer) % len(self.alphabet)
-                    encoded_text += self.alphabet[index]
-        return encoded_text
+        return text.translate(self.encode_table)
 
     def decode(self, text):
-        decoded_text = ""
-        for character in text:
-            for letter in range(len(self.alphabet)):
-                if character == self.alphabet[letter]:
-                    index = (letter * crypto_utils.modular_inverse(self.integer,
-                                                                   len(self.alphabet))) % len(self.alphabet)
-                    decoded_text += self.alphabet[index]
-
-        return decoded_text
+        return text.translate(self.decode_table)
 
     def verify(self):
         if not self.decode(self.encode("CODE")) == "CODE":
@@ -112,120 +415,583 @@ class Affine(Cipher):
         super().__init__(alphabet)
         self.integers = [integer1, integer2]
         self.name = "Affine"
+        inverse = self.alphabet.inverse(integer2)
+        """Caesar then Multiplication folded into one table, and the reverse for decoding"""
+        self.encode_table = self.build_table(lambda index: (index + integer1) * integer2)
+        self.decode_table = self.build_table(lambda index: index * inverse - integer1)
+
+    @classmethod
+    def key_space(cls, alphabet):
+        """(shift, multiplier) for every shift and every unit multiplier, grouped by multiplier"""
+        return [(shift, multiplier) for multiplier in Alphabet.of(alphabet).units for shift in range(len(alphabet))]
+
+    @classmethod
+    def from_key(cls, alphabet, key):
+        return cls(alphabet, *key)
+
+    def keystream(self):
+        return self.integers[1], [self.integers[0] * self.integers[1]]
 
     def get_name(self):
         return self.name
 
     def encode(self, text):
-        return Multiplication(self.alphabet,
-                              self.integers[1]).encode(Caesar(self.alphabet,
-                                                              self.integers[0]).encode(text))
+        return text.translate(self.encode_table)
 
     def decode(self, text):
-        return Caesar(self.alphabet,
-                      self.integers[0]).decode(Multiplication(self.alphabet,
-                                                              self.integers[1]).decode(text))
+        return text.translate(self.decode_table)
 
     def verify(self):
         if not self.decode(self.encode("CODE")) == "CODE":
             raise Exception
 
 
-class Unbreakable(Cipher):
+class Tableau:
+    """
+    The tables of index -> multiplier * index + offset for the offsets of an alphabet, for str and (over a byte
+    alphabet) for bytes; with multiplier 1 this is the Vigenère tableau, the Caesar table of every shift. The offset
+    tables keep unknown characters, the policy table applies the alphabet's unknown policy afterwards. Shared by
+    every Keystream over the alphabet and multiplier; the table of an offset is built when a keystream first uses it.
+    """
+
+    def __init__(self, alphabet, multiplier=1):
+        self.alphabet = alphabet
+        self.multiplier = multiplier
+        self.inverse = alphabet.inverse(multiplier)
+        self.keep_alphabet = alphabet.with_unknown("keep")
+        self.affines = {}
+        self.policy_table = alphabet.table()
+        for letter in alphabet:
+            self.policy_table[ord(letter)] = letter
+        try:
+            self.unknown_bytes = alphabet.unknown_bytes()
+        except ValueError:
+            self.unknown_bytes = None
+
+    def affine(self, offset):
+        """The Affine of offset, built on first use"""
+        affine = self.affines.get(offset)
+        if affine is None:
+            """Affine(shift, multiplier) maps index to multiplier * index + shift * multiplier"""
+            affine = self.affines[offset] = Affine(self.keep_alphabet, offset * self.inverse, self.multiplier)
+        return affine
+
+    def encode_table(self, offset):
+        return self.affine(offset).encode_table
+
+    def decode_table(self, offset):
+        return self.affine(offset).decode_table
+
+    def encode_byte_table(self, offset):
+        return self.affine(offset).get_byte_tables()[0]
+
+    def decode_byte_table(self, offset):
+        return self.affine(offset).get_byte_tables()[1]
+
+    @classmethod
+    def of(cls, alphabet, multiplier=1):
+        """The shared tableau; the TABLEAU_CACHE_SIZE most recently used alphabets and multipliers are kept"""
+        return _tableau(alphabet, multiplier)
+
+    def __reduce__(self):
+        """Process pool workers look up (or build) their own tableau instead of unpickling every table"""
+        return Tableau.of, (self.alphabet, self.multiplier)
+
+
+"""Tableaus kept for reuse; clients of the cracking service can bring any number of alphabets"""
+TABLEAU_CACHE_SIZE = 32
+
+
+@functools.lru_cache(maxsize=TABLEAU_CACHE_SIZE)
+def _tableau(alphabet, multiplier):
+    return Tableau(alphabet, multiplier)
+
+
+class Keystream(Cipher):
+    """
+    Substitutes the character at position i with multiplier * index + offsets[i % len(offsets)] over the alphabet
+    indices. Unbreakable is the keystream of its keyword; a Pipeline folds its substitution stages into one.
+    """
+
+    def __init__(self, alphabet, multiplier, offsets):
+        super().__init__(alphabet)
+        self.multiplier = multiplier % len(self.alphabet)
+        self.shifts = [offset % len(self.alphabet) for offset in offsets]
+        self.name = "Keystream"
+        self.tableau = Tableau.of(self.alphabet, self.multiplier)
+        self.text_tables = None
+
+    def get_name(self):
+        return self.name
+
+    def keystream(self):
+        return (self.multiplier, self.shifts) if self.shifts else None
+
+    def encode(self, text):
+        return self.translate_text(0, text, 0)
+
+    def decode(self, text):
+        return self.translate_text(1, text, 0)
+
+    def encode_chunk(self, text, position):
+        return self.translate_text(0, text, position)
+
+    def decode_chunk(self, text, position):
+        return self.translate_text(1, text, position)
+
+    def keystream_tables(self, tables, position):
+        """The per-shift tables rotated to start <position> characters into a message"""
+        if not tables:
+            return []
+        offset = position % len(tables)
+        return tables[offset:] + tables[:offset]
+
+    def get_text_tables(self):
+        """(a translation table per keystream shift for encoding, one for decoding), built on first use"""
+        if self.text_tables is None:
+            self.text_tables = ([self.tableau.encode_table(shift) for shift in self.shifts],
+                                [self.tableau.decode_table(shift) for shift in self.shifts])
+        return self.text_tables
+
+    def translate_text(self, direction, text, position):
+        """
+        Translates text[offset::len(shifts)] with the table of every keystream position and interleaves the
+        results, then applies the unknown policy; the keystream advances over unknown characters, as it always has.
+        Latin-1 text over a byte alphabet goes through the bytes mode instead, which interleaves without a list.
+        direction is 0 to encode and 1 to decode.
+        """
+        if not self.shifts:
+            return ""
+        unknown = self.alphabet.unknown
+        if self.tableau.unknown_bytes is not None and unknown != "error":
+            try:
+                data = text.encode('latin_1')
+            except UnicodeEncodeError:
+                pass
+            else:
+                return self.translate_strided(self.keystream_tables(self.get_byte_tables()[direction], position),
+                                              self.tableau.unknown_bytes, data, None).decode('latin_1')
+        if unknown == "error":
+            text.translate(self.tableau.policy_table)
+        tables = self.keystream_tables(self.get_text_tables()[direction], position)
+        if len(tables) == 1:
+            result = text.translate(tables[0])
+        else:
+            characters = [""] * len(text)
+            for offset, table in enumerate(tables[:len(text)]):
+                characters[offset::len(tables)] = text[offset::len(tables)].translate(table)
+            result = "".join(characters)
+        if unknown == "drop":
+            result = result.translate(self.tableau.policy_table)
+        return result
+
+    def get_byte_tables(self):
+        """(a 256 byte table per keystream shift for encoding, one for decoding, bytes outside the alphabet)"""
+        if self.byte_tables is None:
+            if self.tableau.unknown_bytes is None:
+                self.alphabet.byte_symbols()
+            self.byte_tables = ([self.tableau.encode_byte_table(shift) for shift in self.shifts],
+                                [self.tableau.decode_byte_table(shift) for shift in self.shifts],
+                                self.tableau.unknown_bytes)
+        return self.byte_tables
+
+    def encode_bytes(self, data, out=None):
+        tables, _, unknown_bytes = self.get_byte_tables()
+        return self.translate_strided(tables, unknown_bytes, data, out)
+
+    def decode_bytes(self, data, out=None):
+        _, tables, unknown_bytes = self.get_byte_tables()
+        return self.translate_strided(tables, unknown_bytes, data, out)
+
+    def translate_strided(self, tables, unknown_bytes, data, out):
+        """
+        Translates data[offset::len(tables)] with tables[offset] for every keystream position and interleaves the
+        results, then applies the unknown policy; the keystream advances over unknown bytes, like in encode
+        """
+        data = as_bytes(data)
+        if not tables:
+            return write_bytes(b"", out)
+        unknown = self.alphabet.unknown
+        if unknown == "error" and unknown_bytes and len(data.translate(None, unknown_bytes)) != len(data):
+            raise ValueError("The data has bytes outside the alphabet")
+        result = bytearray(len(data))
+        for offset, table in enumerate(tables[:len(data)]):
+            result[offset::len(tables)] = data[offset::len(tables)].translate(table)
+        if unknown == "drop" and unknown_bytes:
+            result = result.translate(None, unknown_bytes)
+        return write_bytes(result, out)
+
+
+class Unbreakable(Keystream):
     """uses indexes of a keyword to encode different words"""
 
     def __init__(self, alphabet, keyword):
-        super().__init__(alphabet)
+        alphabet = Alphabet.of(alphabet)
+        """The keyword as Caesar shifts; letters outside the alphabet are skipped"""
+        shifts = [alphabet.indices[letter] for letter in keyword if letter in alphabet]
+        if not shifts:
+            raise ValueError("The keyword %r has no letter in the alphabet" % (keyword,))
+        super().__init__(alphabet, 1, shifts)
         self.keyword = keyword
         self.name = "Unbreakable"
 
+    @classmethod
+    def key_space(cls, alphabet, english_words=None):
+        """
+        The dictionary words with a letter in the alphabet, the keywords a Hacker can search; in capitals if the
+        alphabet has capitals but no small letters
+        """
+        return dictionary_keywords(Alphabet.of(alphabet),
+                                   word_list.load_english_words() if english_words is None else english_words)
+
+    def verify(self):
+        if not self.decode(self.encode("CODE")) == "CODE":
+            raise Exception
+
+
+@functools.lru_cache(maxsize=8)
+def dictionary_keywords(alphabet, english_words):
+    """Unbreakable.key_space, kept for the last few alphabets and word lists"""
+    words = english_words.words
+    if all(letter in alphabet for letter in string.ascii_lowercase):
+        return words
+    if not any(letter in alphabet for letter in string.ascii_lowercase):
+        """Upper-casing keeps the lowercase words sorted"""
+        words = [word.upper() for word in words]
+    return tuple(word for word in words if any(letter in alphabet for letter in word))
+
+
+"""Longest keystream period a Pipeline folds stages into; a longer one starts another pass"""
+MAX_PIPELINE_PERIOD = 1 << 16
+
+
+class FusedStages(Cipher):
+    """
+    Consecutive substitution stages of a Pipeline folded into one Keystream each way. When a stage drops unknown
+    characters before a position dependent stage, that stage sees them gone, so text with unknown characters then
+    runs through the stages one by one.
+    """
+
+    def __init__(self, stages, multiplier, offsets):
+        super().__init__(stages[0].alphabet)
+        self.stages = stages
+        self.name = "FusedStages"
+        encode_unknown, self.encode_exact = self.unknown_plan(stages)
+        decode_unknown, self.decode_exact = self.unknown_plan(stages[::-1])
+        self.encoder = Keystream(self.alphabet.with_unknown(encode_unknown), multiplier, offsets)
+        self.decoder = Keystream(self.alphabet.with_unknown(decode_unknown), multiplier, offsets)
+        self.unknown_table = Tableau.of(self.alphabet.with_unknown("drop")).policy_table
+
+    @staticmethod
+    def unknown_plan(stages):
+        """
+        (unknown policy of the folded stages, True if the fold is exact for any text): the first stage that does not
+        keep unknown characters decides, and the stages after it never see any
+        """
+        for index, stage in enumerate(stages):
+            unknown = stage.alphabet.unknown
+            if unknown != "keep":
+                return unknown, unknown == "error" or all(len(later.keystream()[1]) == 1
+                                                          for later in stages[index + 1:])
+        return "keep", True
+
     def get_name(self):
         return self.name
 
+    def chunk_transforms(self, encode):
+        """The fold when it is exact, otherwise every stage, so that each stage counts the positions it receives"""
+        if encode:
+            return [self.encoder.encode_chunk] if self.encode_exact else \
+                [stage.encode_chunk for stage in self.stages]
+        return [self.decoder.decode_chunk] if self.decode_exact else \
+            [stage.decode_chunk for stage in reversed(self.stages)]
+
+    def has_unknown(self, text):
+        return len(text.translate(self.unknown_table)) != len(text)
+
+    def has_unknown_bytes(self, data):
+        unknown_bytes = self.encoder.get_byte_tables()[2]
+        return bool(unknown_bytes) and len(as_bytes(data).translate(None, unknown_bytes)) != len(data)
+
     def encode(self, text):
-        new_keyword = ""
-        for index in range(len(text)):
-            new_keyword += self.keyword[index % len(self.keyword)]
+        return self.encode_chunk(text, 0)
 
-        encoded_text = ""
-        keyword_count = 0
-        for character in new_keyword:
-            for letter in range(len(self.alphabet)):
-                if character == self.alphabet[letter]:
-                    encoded_text += Caesar(self.alphabet, letter).encode(text[keyword_count])
-                    keyword_count += 1
+    def decode(self, text):
+        return self.decode_chunk(text, 0)
 
-        return encoded_text
+    def encode_chunk(self, text, position):
+        if self.encode_exact or not self.has_unknown(text):
+            return self.encoder.encode_chunk(text, position)
+        for stage in self.stages:
+            text = stage.encode_chunk(text, position)
+        return text
+
+    def decode_chunk(self, text, position):
+        if self.decode_exact or not self.has_unknown(text):
+            return self.decoder.decode_chunk(text, position)
+        for stage in reversed(self.stages):
+            text = stage.decode_chunk(text, position)
+        return text
+
+    def encode_bytes(self, data, out=None):
+        if self.encode_exact or not self.has_unknown_bytes(data):
+            return self.encoder.encode_bytes(data, out)
+        for stage in self.stages:
+            data = stage.encode_bytes(data)
+        return write_bytes(data, out)
+
+    def decode_bytes(self, data, out=None):
+        if self.decode_exact or not self.has_unknown_bytes(data):
+            return self.decoder.decode_bytes(data, out)
+        for stage in reversed(self.stages):
+            data = stage.decode_bytes(data)
+        return write_bytes(data, out)
+
+
+class Pipeline(Cipher):
+    """
+    Ciphers applied one after the other, built with |: (Caesar(alphabet, 3) | Unbreakable(alphabet, "key")).encode(
+    text) is Unbreakable(alphabet, "key").encode(Caesar(alphabet, 3).encode(text)), and decode undoes the stages in
+    reverse. Consecutive Caesar, Multiplication, Affine and Unbreakable stages are folded into one keystream
+    index -> multiplier * index + offsets[position % period] when the pipeline is built, so they cost one pass.
+    """
+
+    def __init__(self, stages):
+        stages = [inner for stage in stages for inner in (stage.stages if isinstance(stage, Pipeline) else [stage])]
+        if not stages:
+            raise ValueError("A pipeline needs at least one stage")
+        super().__init__(stages[0].alphabet)
+        if any(stage.alphabet.symbols != self.alphabet.symbols for stage in stages):
+            raise ValueError("Every stage of a pipeline needs the same alphabet")
+        self.stages = stages
+        self.name = "Pipeline"
+        self.passes = self.fold(stages)
+
+    def fold(self, stages):
+        """The stages with every run of keystream stages folded into one FusedStages"""
+        size = len(self.alphabet)
+        passes = []
+        run = []
+        multiplier, offsets = 1, [0]
+        for stage in stages + [None]:
+            keystream = None if stage is None else stage.keystream()
+            if keystream is not None and keystream[0] % size not in self.alphabet.inverses:
+                """Without an inverse the folded offsets cannot be solved for"""
+                keystream = None
+            if keystream is not None and math.lcm(len(offsets), len(keystream[1])) <= MAX_PIPELINE_PERIOD:
+                run.append(stage)
+                multiplier, offsets = compose_keystreams((multiplier, offsets), keystream, size)
+                continue
+            if len(run) == 1:
+                passes.append(run[0])
+            elif run:
+                passes.append(FusedStages(run, multiplier, offsets))
+            run = []
+            multiplier, offsets = 1, [0]
+            if keystream is not None:
+                run.append(stage)
+                multiplier, offsets = compose_keystreams((multiplier, offsets), keystream, size)
+            elif stage is not None:
+                passes.append(stage)
+        return passes
+
+    def get_name(self):
+        return self.name
+
+    def encode(self, text):
+        for stage in self.passes:
+            text = stage.encode(text)
+        return text
 
     def decode(self, text):
-        new_keyword = ""
-        for index in range(len(text)):
-            new_keyword += self.keyword[index % len(self.keyword)]
+        for stage in reversed(self.passes):
+            text = stage.decode(text)
+        return text
 
-        decoded_text = ""
-        keyword_count = 0
-        for character in new_keyword:
-            for letter in range(len(self.alphabet)):
-                if character == self.alphabet[letter]:
-                    decoded_text += Caesar(self.alphabet, letter).decode(text[keyword_count])
-                    keyword_count += 1
+    def encode_chunk(self, text, position):
+        """
+        Encodes a piece starting <position> characters into the message. Once a stage has dropped characters, the
+        later stages are only given the right position for the first piece; encode_stream keeps track for them.
+        """
+        for stage in self.passes:
+            text = stage.encode_chunk(text, position)
+        return text
+
+    def decode_chunk(self, text, position):
+        for stage in reversed(self.passes):
+            text = stage.decode_chunk(text, position)
+        return text
 
-        return decoded_text
+    def chunk_transforms(self, encode):
+        transforms = []
+        for stage in self.passes if encode else self.passes[::-1]:
+            transforms.extend(stage.chunk_transforms(encode))
+        return transforms
 
     def verify(self):
-        if not self.decode(self.encode("CODE")) == "CODE":
-            raise Exception
+        """Also checks that streaming text with unknown characters in small chunks matches encoding it whole"""
+        super().verify()
+        text = "\u00e9CODE, \u00e9CODE and CODE\u00e9 " * 4
+        for encode in (True, False):
+            destination = io.StringIO()
+            (self.encode_stream if encode else self.decode_stream)(io.StringIO(text), destination, chunk_size=7)
+            if destination.getvalue() != (self.encode(text) if encode else self.decode(text)):
+                raise Exception
+
+    def encode_bytes(self, data, out=None):
+        for stage in self.passes[:-1]:
+            data = stage.encode_bytes(data)
+        return self.passes[-1].encode_bytes(data, out)
+
+    def decode_bytes(self, data, out=None):
+        for stage in self.passes[:0:-1]:
+            data = stage.decode_bytes(data)
+        return self.passes[0].decode_bytes(data, out)
+
+
+def compose_keystreams(first, second, size):
+    """
+    The keystream (multiplier, offsets) of applying keystream first, then second: a2 * (a1 * x + o1) + o2, with
+    the offsets repeating at the least common multiple of both periods, shortened to their own shortest period
+    """
+    multiplier1, offsets1 = first
+    multiplier2, offsets2 = second
+    period = math.lcm(len(offsets1), len(offsets2))
+    offsets = [(multiplier2 * offsets1[position % len(offsets1)] + offsets2[position % len(offsets2)]) % size
+               for position in range(period)]
+    for shortest in range(1, period):
+        if period % shortest == 0 and offsets[shortest:] == offsets[:-shortest]:
+            return multiplier1 * multiplier2 % size, offsets[:shortest]
+    return multiplier1 * multiplier2 % size, offsets
 
 
 class RSA(Cipher):
-    """encodes and decodes integers and text"""
-    """did not have time to finish"""
-
-    def generate_key(self):
-        p = crypto_utils.generate_random_prime(5)
-        q = crypto_utils.generate_random_prime(5)
-        while p == q:
-            q = crypto_utils.generate_random_prime(5)
-        self.n = p * q
-        o = (p-1) * (q-1)
-        self.e = random.randint(3, o-1)
-        self.d = crypto_utils.modular_inverse(self.e, o)
+    """encodes and decodes integers and text in blocks, decoding with the Chinese remainder theorem"""
+
+    def __init__(self, alphabet, bits=1024, e=65537, key_pool=None):
+        super().__init__(alphabet)
+        self.bits = bits
+        self.e = e
+        self.key_pool = key_pool
+        self.name = "RSA"
+        self.n = None
+        self.d = None
+        self.p = None
+        self.q = None
+        self.dp = None
+        self.dq = None
+        self.qinv = None
+        self.encoded_integer = None
+
+    def get_name(self):
+        return self.name
+
+    def encode_bytes(self, data, out=None):
+        """Bytes mode maps every byte to one byte, which RSA blocks cannot do"""
+        raise TypeError("RSA encodes integers and text blocks, see encode_integer and encode_text")
+
+    def decode_bytes(self, data, out=None):
+        raise TypeError("RSA decodes integers and text blocks, see decode_integer and decode_text")
+
+    def generate_key(self, bits=None):
+        """
+        Generates a <bits> bit modulus from two random primes, or takes one from self.key_pool if it uses the same
+        exponent, returns (n, e, d)
+        """
+        if bits is not None:
+            self.bits = bits
+        if self.key_pool is not None and self.key_pool.e == self.e:
+            self.set_key(*self.key_pool.get(self.bits))
+        else:
+            self.set_key(*key_pool.generate_keypair(self.bits, self.e))
         return self.n, self.e, self.d
 
+    def set_key(self, n, e, d=None, p=None, q=None):
+        """Uses a public key (n, e), the private exponent d if known, and the primes p and q for CRT decoding"""
+        self.n = n
+        self.e = e
+        self.d = d
+        self.p = p
+        self.q = q
+        if d is not None and p is not None and q is not None:
+            self.dp = d % (p-1)
+            self.dq = d % (q-1)
+            self.qinv = crypto_utils.modular_inverse(q, p)
+        else:
+            self.dp = self.dq = self.qinv = None
+
+    def get_public_key(self):
+        return self.n, self.e
+
     def encode_integer(self, t):
-        self.encoded_integer = (t ^ self.e) % self.n
+        if self.n is None:
+            self.generate_key()
+        self.encoded_integer = pow(t, self.e, self.n)
         return self.encoded_integer
 
-    def decode_integer(self):
-        return (self.encoded_integer ^ self.d) % self.n
+    def decode_integer(self, c=None):
+        """Decodes c, or the last encoded integer"""
+        if c is None:
+            c = self.encoded_integer
+            if c is None:
+                raise ValueError("Nothing to decode: no integer was given or encoded")
+        if self.d is None:
+            raise ValueError("Decoding needs the private key, this RSA only has the public key")
+        if self.qinv is None:
+            return pow(c, self.d, self.n)
+        m1 = pow(c, self.dp, self.p)
+        m2 = pow(c, self.dq, self.q)
+        h = (self.qinv * (m1 - m2)) % self.p
+        return m2 + h * self.q
+
+    def block_size(self):
+        """Bytes of text per block, so that every block is smaller than n"""
+        size = (self.n.bit_length() - 1) // 8
+        if size < 1:
+            raise ValueError("A %d bit modulus is too small to encode text" % self.n.bit_length())
+        return size
 
     def encode_text(self, text):
-        letter_indexes = ""
-        for letter in text:
-            for index in range(len(ascii_alphabet)):
-                if letter == ascii_alphabet[index]:
-                    letter_indexes += '{0:08b}'.format(index)
-
-        return letter_indexes
+        """Encodes text as a list of encoded block integers, padding the UTF-8 bytes to whole blocks"""
+        if self.n is None:
+            self.generate_key()
+        return [self.encode_integer(block)
+                for block in crypto_utils.blocks_from_text(text, self.block_size(), padding=True)]
+
+    def decode_text(self, blocks):
+        """Decodes a list of block integers from encode_text back to text"""
+        return crypto_utils.text_from_blocks([self.decode_integer(block) for block in blocks],
+                                             self.n.bit_length() // 2, self.block_size(), padding=True)
+
+    def encode_text_stream(self, chunks):
+        """Yields the encoded blocks of an iterable of str or bytes chunks, like encode_text but one block at a time"""
+        if self.n is None:
+            self.generate_key()
+        data = (chunk.encode('utf_8') if isinstance(chunk, str) else chunk for chunk in chunks)
+        for block in crypto_utils.iter_blocks_from_bytes(data, self.block_size()):
+            yield self.encode_integer(block)
+
+    def decode_text_stream(self, blocks):
+        """Yields the text of an iterable of blocks from encode_text or encode_text_stream, one block at a time"""
+        decoder = codecs.getincrementaldecoder('utf_8')()
+        for data in crypto_utils.iter_bytes_from_blocks((self.decode_integer(block) for block in blocks),
+                                                         self.block_size()):
+            text = decoder.decode(data)
+            if text:
+                yield text
+        text = decoder.decode(b"", final=True)
+        if text:
+            yield text
 
-    def decode_text(self, text):
-        decoded_text = ""
-        decoded_bits = 0
-
-        for integer in range(len(text)):
-            if integer % 8 == 0:
-                split = text.split()
-                map_object = map(int, split)
-                list_of_bits = list(map_object)
-                print(list_of_bits)
-
-#        for integer in text.split().:
-#            decoded_bits += int(text[integer:integer+8], 2)
+    def encode(self, text):
+        return self.encode_text(text)
 
-        for integer in decoded_bits:
-            decoded_text += ascii_alphabet[integer]
+    def decode(self, text):
+        return self.decode_text(text)
 
-        return decoded_text
+    def verify(self):
+        if not self.decode(self.encode("CODE")) == "CODE":
+            raise Exception
 
 
 class Person:
@@ -255,6 +1021,10 @@ class Sender(Person):
     def operate_cipher(self):
         return self.cipher.encode(self.text)
 
+    def operate_cipher_stream(self, source, destination):
+        """Encodes a file, mmap or iterator of chunks into destination without holding it in memory"""
+        return self.cipher.encode_stream(source, destination)
+
 
 class Receiver(Person):
     """Person who receives ciphertext, and decodes it to plaintext"""
@@ -266,84 +1036,592 @@ class Receiver(Person):
     def operate_cipher(self):
         return self.cipher.decode(self.text)
 
+    def operate_cipher_stream(self, source, destination):
+        """Decodes a file, mmap or iterator of chunks into destination without holding it in memory"""
+        return self.cipher.decode_stream(source, destination)
+
 
 class Hacker(Person):
-    """Brute force hacker who tries to gain plaintext"""
+    """Brute force hacker who tries to gain plaintext, judging candidates with a scorer from scoring.py"""
 
-    def __init__(self, key, cipher, text, alphabet):
+    def __init__(self, key, cipher, text, alphabet, scorer=None, cache=None, english_words=None):
         super().__init__(key, cipher)
         self.text = text
-        self.alphabet = alphabet
-        file = open('english_words.txt', 'r')
-        self.english_words = file.read().split()
-        file.close()
-
-    def hack(self):
-
-        english_words_count = 0
-        final_shift1 = 0
-        final_shift2 = 0
-
-        if self.cipher.get_name() == "Caesar":
-            for shift in range(len(self.alphabet)):
-                word_count = 0
-                decoded_text = Caesar(self.alphabet, shift).decode(self.text).split(" ")
-                for decoded_word in decoded_text:
-                    for word in self.english_words:
-                        if word == decoded_word:
-                            word_count += 1
-                if word_count > english_words_count:
-                    final_shift1 = shift
-                    english_words_count = word_count
-            return Caesar(self.alphabet, final_shift1).decode(self.text)
-        elif self.cipher.get_name() == "Multiplication":
-            for shift in range(len(self.alphabet)):
-                word_count = 0
-                decoded_text = Multiplication(self.alphabet, shift).decode(self.text).split(" ")
-                for decoded_word in decoded_text:
-                    if self.english_words.__contains__(decoded_word.lower().replace(".", "")):
-                        word_count += 1
-                if word_count > english_words_count:
-                    final_shift1 = shift
-                    english_words_count = word_count
-            return Multiplication(self.alphabet, final_shift1).decode(self.text)
+        self.alphabet = Alphabet.of(alphabet)
+        with instrumentation.phase("load"):
+            self.english_words = word_list.load_english_words() if english_words is None else english_words
+            self.scorer = scoring.DictionaryScorer(self.english_words) if scorer is None else scorer
+        self.cache = cache
+        self.keys = None
+        self.candidate_ciphers = {}
+
+    def hack(self, dictionary_search=False, processes=None, crib=None, crib_offset=None):
+        """
+        Returns the most English looking decoding, searching keys on <processes> cores if given. With a crib, known
+        plaintext starting crib_offset characters into the message (or anywhere if None), the key is solved from the
+        crib first and only searched for if that fails.
+        """
+        instrumentation.count("hacks")
+        final_key = None
+        if crib is not None:
+            with instrumentation.phase("crib"):
+                final_key = self.crib_key(crib, crib_offset)
+        if final_key is None:
+            with instrumentation.phase("find_key"):
+                final_key = self.find_key(dictionary_search, processes)
+        if final_key is None:
+            return self.text
+        with instrumentation.phase("decode_result"):
+            return self.candidate_cipher(final_key).decode(self.text)
+
+    def find_key(self, dictionary_search=False, processes=None):
+        """Recovers the key of self.cipher's type that decodes self.text, looking it up in self.cache first"""
+        if self.cache is None:
+            return self.recover_key(dictionary_search, processes)
+        fingerprint = self.fingerprint(dictionary_search)
+        entry = self.cache.get(fingerprint)
+        if entry is not None:
+            return entry[0]
+        final_key = self.recover_key(dictionary_search, processes)
+        self.remember_key(fingerprint, final_key)
+        return final_key
+
+    def fingerprint(self, dictionary_search=False):
+        """self.cache key of this hack"""
+        mode = self.scorer.get_name() + (":dictionary" if dictionary_search else "")
+        return result_cache.fingerprint(self.cipher.get_name(), self.alphabet, self.text, mode)
+
+    def remember_key(self, fingerprint, final_key):
+        """Stores final_key in self.cache with the score of its decoding"""
+        final_text = self.text if final_key is None else self.candidate_cipher(final_key).decode(self.text)
+        self.cache.put(fingerprint, final_key, self.scorer.score(final_text))
+
+    def recover_key(self, dictionary_search=False, processes=None):
+        """Searches for the key of self.cipher's type that decodes self.text"""
+        if self.cipher.get_name() == "Caesar" or self.cipher.get_name() == "Multiplication":
+            final_key, _ = self.search_keys(0, len(self.key_space()), processes=processes)
+            return 0 if final_key is None else final_key
         elif self.cipher.get_name() == "Affine":
-            for shift in range(len(self.alphabet)):
-                for shift2 in range(len(self.alphabet)):
-                    word_count = 0
-                    decoded_text = Caesar(self.alphabet, shift).decode(Multiplication(self.alphabet, shift2).decode(self.text)).split(" ")
-                    for decoded_word in decoded_text:
-                        if self.english_words.__contains__(decoded_word.lower().replace(".", "")):
-                            word_count += 1
-                    if word_count > english_words_count:
-                        final_shift1 = shift
-                        final_shift2 = shift2
-                        english_words_count = word_count
-            return Caesar(self.alphabet, final_shift1).decode(Multiplication(self.alphabet, final_shift2).decode(self.text))
+            return self.solve_affine(processes)
         else:
-            final_keyword = ""
-            for word in self.english_words:
-                count = 0
-
-                """Create keyword as long as the text"""
-                new_keyword = ""
-                for index in range(len(self.text)):
-                    new_keyword += word[index % len(word)]
-
-                decoded_text = Unbreakable(self.alphabet, new_keyword).decode(self.text)
-                decoded_text = decoded_text.split(" ")
-                for decoded_word in decoded_text:
-                    if self.english_words.__contains__(decoded_word.lower().replace(".", "")):
-                        count += 1
-                if count > english_words_count:
-                    english_words_count = count
-                    final_keyword = new_keyword
+            if not dictionary_search:
+                with instrumentation.phase("break_unbreakable"):
+                    keyword = self.break_unbreakable()
+                if keyword is not None:
+                    return keyword
+            with instrumentation.phase("dictionary_keywords"):
+                return self.search_dictionary_keywords(processes)
+
+    def key_space(self):
+        """Every valid key of self.cipher's type, in search order, enumerated once per Hacker"""
+        if self.keys is None:
+            if self.cipher.get_name() == "Unbreakable":
+                self.keys = Unbreakable.key_space(self.alphabet, self.english_words)
+            else:
+                self.keys = type(self.cipher).key_space(self.alphabet)
+        return self.keys
+
+    def candidate_cipher(self, key):
+        """A cipher of self.cipher's type using key, reusing the translation tables already built for key"""
+        if self.cipher.get_name() == "Unbreakable":
+            return Unbreakable(self.alphabet, key)
+        cipher = self.candidate_ciphers.get(key)
+        if cipher is None:
+            cipher = type(self.cipher).from_key(self.alphabet, key)
+            if len(self.candidate_ciphers) < CANDIDATE_CACHE_SIZE:
+                self.candidate_ciphers[key] = cipher
+        return cipher
+
+    def hacker_for(self, text):
+        """A Hacker for another ciphertext, sharing this one's word list and candidate ciphers"""
+        hacker = copy.copy(self)
+        hacker.text = text
+        return hacker
+
+    def hack_many(self, ciphertexts, dictionary_search=False, processes=None):
+        """
+        Hacks every ciphertext and yields (position, plaintext) pairs as they finish.
+        With <processes> the ciphertexts are spread over a process pool, one Hacker per worker; self.cache is
+        consulted and filled here, so cached ciphertexts never reach the pool.
+        """
+        if processes is None or processes < 2:
+            for position, ciphertext in enumerate(ciphertexts):
+                yield position, self.hacker_for(ciphertext).hack(dictionary_search)
+            return
+
+        hackers = {}
+        for position, ciphertext in enumerate(ciphertexts):
+            hacker = self.hacker_for(ciphertext)
+            entry = None if self.cache is None else self.cache.get(hacker.fingerprint(dictionary_search))
+            if entry is None:
+                hackers[position] = hacker
+            else:
+                yield position, ciphertext if entry[0] is None else hacker.candidate_cipher(entry[0]).decode(ciphertext)
+
+        context = search_pool_context()
+        with concurrent.futures.ProcessPoolExecutor(processes, mp_context=context, initializer=_init_search_worker,
+                                                    initargs=(self.cipher, self.text, self.alphabet, None,
+                                                              self.scorer, self.english_words)) as executor:
+            futures = {executor.submit(_find_text_key, hacker.text, dictionary_search): position
+                       for position, hacker in hackers.items()}
+            for future in concurrent.futures.as_completed(futures):
+                hacker = hackers[futures[future]]
+                final_key = future.result()
+                if self.cache is not None:
+                    hacker.remember_key(hacker.fingerprint(dictionary_search), final_key)
+                yield futures[future], hacker.text if final_key is None else \
+                    hacker.candidate_cipher(final_key).decode(hacker.text)
+
+    def search_keys(self, start, stop, threshold=None, processes=None, stop_event=None, positions=None):
+        """
+        Scores key_space()[start:stop], or the keys at the given positions in this process, and returns
+        (best key, its score), or (None, None) for no keys.
+        The search stops as soon as a key scores above threshold. An incremental scorer is given the best score so
+        far, so it can abort a key before its whole decoding is done.
+        """
+        if processes is not None and processes > 1 and positions is None:
+            return self.parallel_search_keys(start, stop, threshold, processes)
+
+        final_key = None
+        final_score = None
+        keys = self.key_space()
+        if positions is None:
+            positions = range(start, stop)
+        decodings = None
+        score_text = instrumentation.instrument(self.scorer.score, "score", "keys_tried")
+        score_decoding = instrumentation.instrument(self.scorer.score_decoding, "decode_and_score", "keys_tried")
+        if not self.scorer.incremental:
+            decodings = instrumentation.instrument_decodings(self.candidate_decodings(keys, positions))
+        elif threshold is None:
+            """Try the keys with the most English looking start first, so the rest abort sooner"""
+            prefix = self.text[:self.scorer.chunk_size]
+            with instrumentation.phase("order_keys"):
+                positions = sorted(positions, key=lambda position: -self.scorer.score(
+                    self.candidate_cipher(keys[position]).decode_chunk(prefix, 0)))
+        for position in positions:
+            if stop_event is not None and position % 64 == 0 and stop_event.is_set():
+                break
+            if decodings is None:
+                score = score_decoding(self.candidate_cipher(keys[position]), self.text, final_score)
+            else:
+                score = score_text(next(decodings))
+            if score is not None and (final_score is None or score > final_score):
+                final_key = keys[position]
+                final_score = score
 
                 """breakpoint so that the code doesn't run too long"""
-                if english_words_count > len(self.text)/5:
-                    return Unbreakable(self.alphabet, final_keyword).decode(self.text)
-
-            return Unbreakable(self.alphabet, final_keyword).decode(self.text)
+                if threshold is not None and final_score > threshold:
+                    if stop_event is not None:
+                        stop_event.set()
+                    break
+        return final_key, final_score
+
+    def candidate_decodings(self, keys, positions):
+        """Yields self.text decoded under the keys at positions, with every key in one NumPy pass when that is faster"""
+        if self.cipher.get_name() != "Unbreakable" and self.alphabet.unknown == "drop" and vectorized.available() \
+                and len(self.text) <= vectorized.MAX_TEXT_LENGTH:
+            return vectorized.decode_all(self.cipher.get_name(), self.alphabet, self.text,
+                                         [keys[position] for position in positions])
+        return (self.candidate_cipher(keys[position]).decode(self.text) for position in positions)
+
+    def parallel_search_keys(self, start, stop, threshold, processes):
+        """search_keys with key_space()[start:stop] split into index ranges over a process pool"""
+        if start >= stop:
+            return None, None
+        context = search_pool_context()
+        stop_event = context.Event()
+        chunk = max(1, -(-(stop - start) // (processes * 4)))
+        results = []
+        with concurrent.futures.ProcessPoolExecutor(processes, mp_context=context, initializer=_init_search_worker,
+                                                    initargs=(self.cipher, self.text, self.alphabet, stop_event,
+                                                              self.scorer, self.english_words)) as executor:
+            futures = {executor.submit(_search_chunk, position, min(position + chunk, stop), threshold): position
+                       for position in range(start, stop, chunk)}
+            for future in concurrent.futures.as_completed(futures):
+                final_key, final_score = future.result()
+                if final_score is None:
+                    continue
+                results.append((final_score, -futures[future], final_key))
+                if threshold is not None and final_score > threshold:
+                    stop_event.set()
+                    for pending in futures:
+                        pending.cancel()
+                    break
+        if not results:
+            return None, None
+        final_score, _, final_key = max(results, key=lambda result: result[:2])
+        return final_key, final_score
+
+    def search_dictionary_keywords(self, processes=None):
+        """
+        Tries the dictionary words as the Unbreakable keyword: first only those whose decoding starts with a
+        dictionary word, then every word if none of those reads as English
+        """
+        threshold = self.scorer.threshold(self.text)
+        pruned = self.search_plausible_keywords(threshold)
+        if pruned is not None and pruned[2]:
+            return pruned[0]
+        final_keyword, _ = self.search_keys(0, len(self.key_space()), threshold, processes)
+        return final_keyword
+
+    def search_plausible_keywords(self, threshold=None):
+        """
+        (best keyword, its score, True if its decoding reads as English, keywords scored) of the keywords from
+        plausible_keyword_positions(), or None if the word list cannot prune
+        """
+        with instrumentation.phase("prune_keywords"):
+            positions = self.plausible_keyword_positions()
+        if positions is None:
+            return None
+        final_keyword, final_score = self.search_keys(0, len(self.key_space()), threshold, positions=positions)
+        accepted = final_keyword is not None and self.scorer.accepts(
+            final_score, self.candidate_cipher(final_keyword).decode(self.text))
+        return final_keyword, final_score, accepted, len(positions)
+
+    def plausible_keyword_positions(self):
+        """
+        key_space() positions of the keywords whose decoding of self.text starts with a dictionary word (or, while
+        the keyword is shorter than that word, with the prefix of one), or None if the word list cannot answer
+        prefix queries. The sorted words are walked as a trie: the plaintext decoded under a keyword prefix is
+        kept on a stack and shared by every word below it, and once it rules the prefix out, every word below it
+        is skipped. Words with letters outside the alphabet are always kept.
+        """
+        keys = self.key_space()
+        if not hasattr(self.english_words, "has_prefix"):
+            return None
+        tableau = Tableau.of(self.alphabet)
+        indices = self.alphabet.indices
+        text = self.text
+        positions = []
+        """plaintexts[depth] is text[:depth] decoded under the first depth letters, None once the first word is in"""
+        plaintexts = [""]
+        previous = ""
+        position = 0
+        while position < len(keys):
+            word = keys[position]
+            common = 0
+            limit = min(len(previous), len(word), len(plaintexts) - 1)
+            while common < limit and previous[common] == word[common]:
+                common += 1
+            del plaintexts[common + 1:]
+            previous = word
+            depth = common
+            plausible = True
+            while plausible and plaintexts[depth] is not None and depth < min(len(word), len(text)):
+                shift = indices.get(word[depth])
+                if shift is None:
+                    break
+                plaintext = plaintexts[depth] + text[depth].translate(tableau.decode_table(shift)).translate(
+                    tableau.policy_table)
+                plausible = self.first_word_plausible(plaintext, depth + 1 == len(text))
+                if plausible:
+                    plaintexts.append(None if plausible == "complete" else plaintext)
+                    depth += 1
+            if plausible:
+                positions.append(position)
+                position += 1
+            else:
+                """Skip the subtree of the prefix that was ruled out"""
+                prefix = word[:depth + 1]
+                position += 1
+                while position < len(keys) and keys[position].startswith(prefix):
+                    position += 1
+        if instrumentation.enabled:
+            instrumentation.count("keywords_pruned", len(keys) - len(positions))
+        return positions
+
+    def first_word_plausible(self, plaintext, finished):
+        """
+        "complete" if the first word of plaintext is a dictionary word, True if plaintext, finished or not, may still
+        start with one, False otherwise; words are compared like DictionaryScorer does
+        """
+        plaintext = plaintext.lstrip(" ")
+        if " " in plaintext or (finished and plaintext):
+            first_word = plaintext.split(" ", 1)[0].lower().replace(".", "")
+            return "complete" if first_word in self.english_words else False
+        return not plaintext or self.english_words.has_prefix(plaintext.lower().replace(".", ""))
+
+    def english_model(self):
+        """Expected probability of each alphabet symbol in English text"""
+        letters = english_frequency_order.replace(" ", "")
+        has_lower = any(letter in self.alphabet for letter in letters)
+        weights = []
+        for symbol in self.alphabet:
+            if symbol == " ":
+                weights.append(english_symbol_frequencies[" "])
+            elif symbol.lower() in english_symbol_frequencies and (symbol.islower() or not has_lower):
+                weights.append(english_symbol_frequencies[symbol.lower()])
+            elif symbol.lower() in english_symbol_frequencies:
+                """Capital letters in mixed case text"""
+                weights.append(english_symbol_frequencies[symbol.lower()] * 0.03)
+            else:
+                weights.append(0.05)
+        total = sum(weights)
+        return [weight / total for weight in weights]
+
+    def key_length_candidates(self, indices, max_key_length, count=3):
+        """Key lengths ranked by the average index of coincidence of their cosets"""
+        coincidences = []
+        for key_length in range(1, max_key_length + 1):
+            total = 0
+            for start in range(key_length):
+                coset = indices[start::key_length]
+                if len(coset) > 1:
+                    total += sum(frequency * (frequency - 1) for frequency in Counter(coset).values()) \
+                             / (len(coset) * (len(coset) - 1))
+            coincidences.append((total / key_length, -key_length))
+        return [-key_length for _, key_length in sorted(coincidences, reverse=True)[:count]]
+
+    def solve_coset(self, coset, model):
+        """The Caesar shift that gives the coset the lowest chi-squared against the model"""
+        size = len(self.alphabet)
+        counts = [0] * size
+        for index in coset:
+            counts[index] += 1
+        expected = [probability * len(coset) for probability in model]
+        best_shift, best_chi_squared = 0, None
+        for shift in range(size):
+            chi_squared = 0
+            for plain in range(size):
+                difference = counts[(plain + shift) % size] - expected[plain]
+                chi_squared += difference * difference / expected[plain]
+            if best_chi_squared is None or chi_squared < best_chi_squared:
+                best_shift, best_chi_squared = shift, chi_squared
+        return best_shift
+
+    def break_unbreakable(self, max_key_length=32):
+        """Finds the Unbreakable keyword with index of coincidence and chi-squared, or None"""
+        positions = self.alphabet.indices
+        indices = [positions[symbol] for symbol in self.text if symbol in positions]
+        max_key_length = min(max_key_length, len(indices) // 4)
+        if max_key_length < 1:
+            return None
+
+        model = self.english_model()
+        final_keyword = None
+        final_score = None
+        final_text = None
+        for key_length in self.key_length_candidates(indices, max_key_length):
+            keyword = "".join(self.alphabet[self.solve_coset(indices[start::key_length], model)]
+                              for start in range(key_length))
+            decoded_text = Unbreakable(self.alphabet, keyword).decode(self.text)
+            score = self.scorer.score(decoded_text)
+            if instrumentation.enabled:
+                instrumentation.count("keys_tried")
+                instrumentation.count("decodes")
+                instrumentation.count("characters_decoded", len(decoded_text))
+            if final_score is None or score > final_score or (score == final_score
+                                                               and len(keyword) < len(final_keyword)):
+                final_keyword, final_score, final_text = keyword, score, decoded_text
+        if final_keyword is not None and self.scorer.accepts(final_score, final_text):
+            return final_keyword
+        return None
+
+    def expected_symbols(self):
+        """The most frequent English plaintext symbols in the alphabet, most frequent first"""
+        symbols = [symbol for symbol in english_frequency_order if symbol in self.alphabet]
+        if len(symbols) < 2:
+            symbols = [symbol for symbol in english_frequency_order.upper() if symbol in self.alphabet]
+        return symbols
+
+    def affine_candidates(self, ciphertext_symbols=4, plaintext_symbols=6):
+        """Affine keys ranked by how many pairings of common cipher and plain symbols solve to them"""
+        size = len(self.alphabet)
+        indices = self.alphabet.indices
+        common = [indices[symbol] for symbol, _ in
+                  Counter(symbol for symbol in self.text if symbol in indices).most_common(ciphertext_symbols)]
+        expected = [self.alphabet.index(symbol) for symbol in self.expected_symbols()[:plaintext_symbols]]
+        votes = Counter()
+        for cipher1, cipher2 in itertools.permutations(common, 2):
+            for plain1, plain2 in itertools.permutations(expected, 2):
+                """c = m*p + m*s, so m*(p1 - p2) = c1 - c2"""
+                for multiplier in crypto_utils.solve_linear_congruence(plain1 - plain2, cipher1 - cipher2, size):
+                    if multiplier not in self.alphabet.inverses:
+                        continue
+                    shift = (cipher1 * self.alphabet.inverses[multiplier] - plain1) % size
+                    votes[(shift, multiplier)] += 1
+        return [key for key, _ in votes.most_common()]
+
+    def best_affine_candidate(self):
+        """(key, score, accepted) of the best frequency ranked Affine key, or ((0, 0), None, False) if there is none"""
+        final_key = (0, 0)
+        final_score = None
+        final_text = None
+        with instrumentation.phase("affine_candidates"):
+            candidates = self.affine_candidates()
+        for key in candidates:
+            decoded_text = self.candidate_cipher(key).decode(self.text)
+            score = self.scorer.score(decoded_text)
+            if instrumentation.enabled:
+                instrumentation.count("keys_tried")
+                instrumentation.count("decodes")
+                instrumentation.count("characters_decoded", len(decoded_text))
+            if final_score is None or score > final_score:
+                final_key, final_score, final_text = key, score, decoded_text
+        return final_key, final_score, final_score is not None and self.scorer.accepts(final_score, final_text)
+
+    def solve_affine(self, processes=None):
+        """Verifies the frequency ranked Affine keys, or searches every invertible key if none reads as English"""
+        final_key, final_score, accepted = self.best_affine_candidate()
+        if accepted:
+            return final_key
+
+        key, score = self.search_keys(0, len(self.key_space()), processes=processes)
+        if score is not None and (final_score is None or score > final_score):
+            final_key = key
+        return final_key
+
+    def crib_key(self, crib, offset=None):
+        """
+        The key solved from known plaintext crib starting <offset> characters into the message, or at any offset if
+        None, or None if no key fits. Fitting keys are verified with one decode each and told apart by the scorer;
+        the best one is only returned if its decoding reads as English, since a short crib can fit at the wrong offset
+        by chance. Crib symbols outside the alphabet must appear in the ciphertext unchanged.
+        """
+        offsets = range(len(self.text) - len(crib) + 1) if offset is None else [offset]
+        candidates = list(dict.fromkeys(key for start in offsets for key in self.crib_candidates(crib, start,
+                                                                                                 offset is not None)))
+        instrumentation.count("crib_candidates", len(candidates))
+        if not candidates:
+            return None
+        final_key, final_score, final_text = None, None, None
+        for key in candidates:
+            decoded_text = self.candidate_cipher(key).decode(self.text)
+            score = self.scorer.score(decoded_text)
+            if final_score is None or score > final_score:
+                final_key, final_score, final_text = key, score, decoded_text
+        return final_key if self.scorer.accepts(final_score, final_text) else None
+
+    def crib_pairs(self, crib, offset):
+        """(position in crib, plain index, cipher index) for the crib symbols in the alphabet, or None on a mismatch"""
+        if offset < 0 or offset + len(crib) > len(self.text):
+            return None
+        indices = self.alphabet.indices
+        pairs = []
+        for position, (plain, cipher) in enumerate(zip(crib, self.text[offset:offset + len(crib)])):
+            if plain in indices and cipher in indices:
+                pairs.append((position, indices[plain], indices[cipher]))
+            elif plain != cipher or plain in indices or cipher in indices:
+                return None
+        return pairs
+
+    def crib_candidates(self, crib, offset, search_words=True):
+        """Yields the keys of self.cipher's type that encode crib into the ciphertext at offset"""
+        pairs = self.crib_pairs(crib, offset)
+        if not pairs:
+            return
+        if self.cipher.get_name() == "Unbreakable":
+            yield from self.keystream_keywords(crib, offset, pairs, search_words)
+            return
+        for shift, multiplier in self.affine_solutions(pairs):
+            if self.cipher.get_name() == "Caesar" and multiplier == 1:
+                yield shift
+            elif self.cipher.get_name() == "Multiplication" and shift == 0:
+                yield multiplier
+            elif self.cipher.get_name() == "Affine":
+                yield shift, multiplier
+
+    def affine_solutions(self, pairs):
+        """
+        Every invertible (shift, multiplier) with (plain + shift) * multiplier = cipher for all pairs: the first pair
+        and one with another plain index give multiplier * (plain1 - plain2) = cipher1 - cipher2, then
+        shift = cipher1 / multiplier - plain1
+        """
+        size = len(self.alphabet)
+        _, plain1, cipher1 = pairs[0]
+        multipliers = self.alphabet.units
+        for _, plain2, cipher2 in pairs[1:]:
+            if plain2 != plain1:
+                multipliers = crypto_utils.solve_linear_congruence(plain1 - plain2, cipher1 - cipher2, size)
+                break
+        for multiplier in multipliers:
+            if multiplier not in self.alphabet.inverses:
+                continue
+            shift = (cipher1 * self.alphabet.inverse(multiplier) - plain1) % size
+            if all((plain + shift) * multiplier % size == cipher for _, plain, cipher in pairs):
+                yield shift, multiplier
+
+    def keystream_keywords(self, crib, offset, pairs, search_words=True):
+        """
+        Yields the Unbreakable keywords that fit the keystream read off the crib: the ones repeating within the crib,
+        shortest first and without their multiples, then, if search_words, the longer dictionary words that fit
+        """
+        size = len(self.alphabet)
+        shifts = {position: (cipher - plain) % size for position, plain, cipher in pairs}
+        periods = []
+        for period in range(1, len(crib) // 2 + 1):
+            if any(period % shorter == 0 for shorter in periods):
+                continue
+            keyword = self.keystream_keyword(shifts, offset, period)
+            if keyword is not None:
+                periods.append(period)
+                yield keyword
+        if not search_words:
+            return
+        keywords = {}
+        for word in self.key_space():
+            if len(word) <= len(crib) // 2:
+                continue
+            keyword = keywords.get(len(word))
+            if keyword is None:
+                keyword = keywords[len(word)] = self.keystream_keyword(shifts, offset, len(word), partial=True) or ()
+            if keyword and all(letter is None or letter == symbol for letter, symbol in zip(keyword, word)):
+                yield word
+
+    def keystream_keyword(self, shifts, offset, period, partial=False):
+        """
+        The keyword of length period whose shift at every message position offset + crib position is
+        shifts[crib position], or None if the shifts disagree; with partial, letters no shift fixes are None
+        """
+        letters = [None] * period
+        for position, shift in shifts.items():
+            letter = self.alphabet[shift]
+            index = (offset + position) % period
+            if letters[index] is None:
+                letters[index] = letter
+            elif letters[index] != letter:
+                return None
+        if partial:
+            return letters
+        if None in letters:
+            return None
+        return "".join(letters)
+
+
+def search_pool_context():
+    """
+    The multiprocessing context of search pools: fork where available, so that workers inherit the loaded word list
+    instead of reading or pickling it
+    """
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return multiprocessing.get_context()
+
+
+_search_hacker = None
+_search_stop_event = None
+
+
+def _init_search_worker(cipher, text, alphabet, stop_event, scorer, english_words):
+    """Process pool initializer giving each worker one Hacker for the whole search"""
+    global _search_hacker, _search_stop_event
+    _search_hacker = Hacker(None, cipher, text, alphabet, scorer, english_words=english_words)
+    _search_stop_event = stop_event
+
+
+def _search_chunk(start, stop, threshold):
+    """Process pool task searching key_space()[start:stop] of the worker's Hacker"""
+    return _search_hacker.search_keys(start, stop, threshold, stop_event=_search_stop_event)
+
+
+def _find_text_key(text, dictionary_search):
+    """Process pool task recovering the key of one ciphertext with the worker's Hacker"""
+    return _search_hacker.hacker_for(text).find_key(dictionary_search)
+
+
+def hack_many(cipher, ciphertexts, alphabet, dictionary_search=False, processes=None, scorer=None, cache=None):
+    """Hacks a batch of ciphertexts made with ciphers of cipher's type, see Hacker.hack_many"""
+    return Hacker(None, cipher, "", alphabet, scorer, cache).hack_many(ciphertexts, dictionary_search, processes)
 
 
 def main():
@@ -405,6 +1683,9 @@ def main():
     """verifies that the Unbreakable cipher works"""
     Unbreakable(ascii_alphabet, "PIZZA").verify()
 
+    """verifies that a Pipeline works, streaming included"""
+    (Caesar(ascii_alphabet, 3) | Unbreakable(ascii_alphabet, "ab") | Affine(ascii_alphabet, 2, 5)).verify()
+
     """Testing RSA cipher"""
     rsa = RSA(ascii_alphabet)
     rsa.generate_key()
@@ -414,11 +1695,14 @@ def main():
     print("RSA decoded integer:", decoded_text)
     print("\n")
 
-#    encoded_text = rsa.encode_text("CODE")
-#    print(encoded_text)
+    encoded_text = rsa.encode_text("This is a sentence.")
+    decoded_text = rsa.decode_text(encoded_text)
+    print("RSA encoded text:", encoded_text)
+    print("RSA decoded text:", decoded_text)
+    print("\n")
 
-#    decoded_text = rsa.decode_text(encoded_text)
-#    print(decoded_text)
+    """verifies that the RSA cipher works"""
+    rsa.verify()
 
 
     """Testing the Hacker with Caesar cipher"""
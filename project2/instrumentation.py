@@ -0,0 +1,206 @@
+"""Counters, phase timers and optional cProfile/tracemalloc capture for the Cipher and Hacker hot paths
+
+Instrument a block of code:
+    with instrumentation.capture(profile=True, memory=True) as report:
+        hacker.hack()
+    print(report.to_json())
+
+or a whole run, writing the report to stderr (or to CRYPTO_INSTRUMENT_REPORT) at exit:
+    CRYPTO_INSTRUMENT=counters,profile,memory python cryptography.py
+
+When disabled the hot paths pay one check of `enabled` per call at most. Only the current process is measured;
+process pool workers keep their own, unreported, counts.
+"""
+import atexit
+import collections
+import contextlib
+import cProfile
+import json
+import os
+import pstats
+import sys
+import time
+import tracemalloc
+
+"""Functions listed in the profile, by cumulative time"""
+PROFILE_TOP = 25
+
+"""Allocation sites listed in the memory report, by size"""
+MEMORY_TOP = 10
+
+enabled = False
+
+
+class Report:
+    """Counters and timers of one capture, with the profile and memory statistics when they were captured"""
+
+    def __init__(self):
+        self.counters = collections.Counter()
+        self.timers = collections.defaultdict(float)
+        self.timer_calls = collections.Counter()
+        self.profile = None
+        self.memory = None
+        self.wall_time = None
+
+    def count(self, name, amount=1):
+        self.counters[name] += amount
+
+    def add_time(self, name, seconds):
+        self.timers[name] += seconds
+        self.timer_calls[name] += 1
+
+    def as_dict(self):
+        report = {"wall_time_s": self.wall_time,
+                  "counters": dict(self.counters),
+                  "timers_s": dict(self.timers),
+                  "timer_calls": dict(self.timer_calls)}
+        if self.profile is not None:
+            report["profile"] = self.profile
+        if self.memory is not None:
+            report["memory"] = self.memory
+        return report
+
+    def to_json(self, indent=2):
+        return json.dumps(self.as_dict(), indent=indent)
+
+    def write(self, path):
+        with open(path, "w") as file:
+            file.write(self.to_json())
+
+
+report = Report()
+_capture = None
+
+
+def count(name, amount=1):
+    """Adds amount to a counter of the current report, if instrumentation is enabled"""
+    if enabled:
+        report.count(name, amount)
+
+
+@contextlib.contextmanager
+def phase(name):
+    """Times the block as phase <name> of the current report, if instrumentation is enabled"""
+    if not enabled:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        report.add_time(name, time.perf_counter() - started)
+
+
+def instrument(function, timer, counter=None):
+    """
+    function itself when instrumentation is disabled, otherwise a wrapper adding its run time to <timer> and
+    counting its calls in <counter>. Hot loops fetch the wrapper once, so that they do not check enabled per call.
+    """
+    if not enabled:
+        return function
+
+    def instrumented(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            report.add_time(timer, time.perf_counter() - started)
+            if counter is not None:
+                report.count(counter)
+    return instrumented
+
+
+def instrument_decodings(decodings):
+    """decodings itself when disabled, otherwise a generator timing each decode and counting decodes and characters"""
+    if not enabled:
+        return decodings
+
+    def instrumented():
+        iterator = iter(decodings)
+        while True:
+            started = time.perf_counter()
+            try:
+                decoded_text = next(iterator)
+            except StopIteration:
+                return
+            report.add_time("decode", time.perf_counter() - started)
+            report.count("decodes")
+            report.count("characters_decoded", len(decoded_text))
+            yield decoded_text
+    return instrumented()
+
+
+def start(profile=False, memory=False):
+    """Enables instrumentation with a new current report, also running cProfile and tracemalloc if asked"""
+    global enabled, report, _capture
+    profiler = cProfile.Profile() if profile else None
+    started_tracemalloc = memory and not tracemalloc.is_tracing()
+    if started_tracemalloc:
+        tracemalloc.start()
+    _capture = (enabled, report, _capture, profiler, memory, started_tracemalloc, time.perf_counter())
+    enabled = True
+    report = Report()
+    if profiler is not None:
+        profiler.enable()
+    return report
+
+
+def stop():
+    """Ends the capture begun by the last start() and returns its report, restoring the previous state"""
+    global enabled, report, _capture
+    previous_enabled, previous_report, previous_capture, profiler, memory, started_tracemalloc, started = _capture
+    finished = report
+    finished.wall_time = time.perf_counter() - started
+    if profiler is not None:
+        profiler.disable()
+        finished.profile = profile_summary(profiler)
+    if memory:
+        current, peak = tracemalloc.get_traced_memory()
+        top = tracemalloc.take_snapshot().statistics("lineno")[:MEMORY_TOP]
+        finished.memory = {"current_bytes": current, "peak_bytes": peak,
+                           "top": [{"site": str(statistic.traceback[0]), "bytes": statistic.size,
+                                    "blocks": statistic.count} for statistic in top]}
+        if started_tracemalloc:
+            tracemalloc.stop()
+    enabled, report, _capture = previous_enabled, previous_report, previous_capture
+    return finished
+
+
+@contextlib.contextmanager
+def capture(profile=False, memory=False):
+    """Instruments the block and yields its Report, which is complete once the block has finished"""
+    captured = start(profile, memory)
+    try:
+        yield captured
+    finally:
+        stop()
+
+
+def profile_summary(profiler):
+    """The PROFILE_TOP functions with the most cumulative time, as dicts"""
+    statistics = pstats.Stats(profiler).stats
+    rows = sorted(statistics.items(), key=lambda item: item[1][3], reverse=True)[:PROFILE_TOP]
+    return [{"function": "%s:%d(%s)" % (filename, line, name), "calls": calls, "total_s": total,
+             "cumulative_s": cumulative}
+            for (filename, line, name), (_, calls, total, cumulative, _) in rows]
+
+
+def _report_at_exit():
+    finished = stop()
+    path = os.environ.get("CRYPTO_INSTRUMENT_REPORT")
+    if path:
+        finished.write(path)
+    else:
+        print(finished.to_json(), file=sys.stderr)
+
+
+def _start_from_environment():
+    """Starts a capture for the whole run when CRYPTO_INSTRUMENT is set, e.g. to 1 or counters,profile,memory"""
+    options = os.environ.get("CRYPTO_INSTRUMENT", "").lower().replace(" ", "").split(",")
+    if options == [""] or options == ["0"]:
+        return
+    start("profile" in options, "memory" in options)
+    atexit.register(_report_at_exit)
+
+
+_start_from_environment()
@@ -0,0 +1,248 @@
+"""Pool of ready RSA keypairs, refilled in the background, so that taking a fresh key is a lookup"""
+import collections
+import concurrent.futures
+import json
+import math
+import os
+import threading
+import time
+
+import crypto_utils
+
+"""Keypairs kept ready per bit size"""
+DEFAULT_DEPTH = 4
+
+DEFAULT_EXPONENT = 65537
+
+
+def generate_keypair(bits, e=DEFAULT_EXPONENT):
+    """A <bits> bit modulus from two random primes, as (n, e, d, p, q)"""
+    while True:
+        """generate_random_prime(k) gives a k+1 bit prime; with its top two bits set, p * q has bits bits"""
+        p = crypto_utils.generate_random_prime(bits // 2 - 1, top_bits=2)
+        q = crypto_utils.generate_random_prime(bits - bits // 2 - 1, top_bits=2)
+        o = (p-1) * (q-1)
+        if p != q and (p * q).bit_length() == bits and math.gcd(e, o) == 1:
+            return p * q, e, crypto_utils.modular_inverse(e, o), p, q
+
+
+class KeyPool:
+    """
+    Keeps <depth> keypairs ready for every bit size in sizes, plus any size asked for later. <workers> background
+    threads refill the pool as keys are taken, generating the keys in a process pool, or in the threads themselves
+    if processes is False. With a path the ready keys are also kept in a JSON file, so that a restart starts with a
+    full pool; the file holds private keys and is only readable by its owner, and get() saves the pool before it
+    returns a key, so that no key is handed out twice, even across a crash. A process pool that breaks, e.g. when a
+    worker is killed, is replaced; if keys still cannot be generated, get() and fill() raise RuntimeError instead of
+    waiting forever. Safe to share between threads.
+    """
+
+    def __init__(self, sizes=(1024,), depth=DEFAULT_DEPTH, workers=1, e=DEFAULT_EXPONENT, path=None, processes=True):
+        if depth < 1:
+            raise ValueError("A key pool needs room for at least one key per size")
+        self.depth = depth
+        self.e = e
+        self.path = path
+        self.keys = {}
+        self.in_flight = collections.Counter()
+        self.generated = collections.Counter()
+        self.generation_time = collections.defaultdict(float)
+        self.served = collections.Counter()
+        self.waits = collections.Counter()
+        self.condition = threading.Condition()
+        self.save_lock = threading.Lock()
+        self.closed = False
+        """The error that stopped key generation, once a replaced process pool broke too or a key failed"""
+        self.failure = None
+        self.dirty = False
+        self.started = time.perf_counter()
+        for bits in sizes:
+            self.keys[bits] = collections.deque()
+        if path is not None and os.path.exists(path):
+            self.load()
+        self.workers = workers
+        self.executor = concurrent.futures.ProcessPoolExecutor(workers) if processes else None
+        """Whether the process pool replaces one that broke and has not generated a key yet"""
+        self.untried_replacement = False
+        self.threads = [threading.Thread(target=self.refill, name="key-pool-%d" % index, daemon=True)
+                        for index in range(workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def get(self, bits=1024, timeout=None):
+        """
+        A fresh keypair (n, e, d, p, q) with a <bits> bit modulus, taken from the pool; waits for one if the pool
+        of that size is empty, raising TimeoutError after timeout seconds. Every key is handed out once; with a path,
+        the key is only returned once the file no longer holds it.
+        """
+        with self.condition:
+            if self.closed:
+                raise ValueError("The key pool is closed")
+            if bits not in self.keys:
+                self.keys[bits] = collections.deque()
+            keys = self.keys[bits]
+            if not keys:
+                self.check_failure()
+                self.waits[bits] += 1
+                self.condition.notify_all()
+                if not self.condition.wait_for(lambda: keys or self.closed or self.failure, timeout):
+                    raise TimeoutError("No %d bit key was ready within %s seconds" % (bits, timeout))
+                if self.closed:
+                    raise ValueError("The key pool is closed")
+                if not keys:
+                    self.check_failure()
+            key = keys.popleft()
+            self.served[bits] += 1
+            self.dirty = self.path is not None
+            self.condition.notify_all()
+        self.save_changes()
+        return key
+
+    def wanted(self):
+        """The bit size furthest below depth, counting keys being generated, or None if every size is full"""
+        missing = [(len(keys) + self.in_flight[bits], bits) for bits, keys in self.keys.items()
+                   if len(keys) + self.in_flight[bits] < self.depth]
+        return min(missing)[1] if missing else None
+
+    def check_failure(self):
+        """Raises RuntimeError if key generation has stopped"""
+        if self.failure is not None:
+            raise RuntimeError("The key pool cannot generate keys: %r" % (self.failure,)) from self.failure
+
+    def refill(self):
+        """Background thread generating keys for the sizes below depth, and saving the pool when it changed"""
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.closed or self.failure or self.wanted() is not None)
+                if self.closed or self.failure:
+                    return
+                bits = self.wanted()
+                self.in_flight[bits] += 1
+                executor = self.executor
+            self.save_changes()
+            started = time.perf_counter()
+            try:
+                if executor is None:
+                    key = generate_keypair(bits, self.e)
+                else:
+                    key = executor.submit(generate_keypair, bits, self.e).result()
+            except concurrent.futures.BrokenExecutor as error:
+                self.replace_executor(executor, error)
+                continue
+            except Exception as error:
+                if self.closed:
+                    """The pool was closed while the key was being generated"""
+                    return
+                if executor is self.executor:
+                    self.fail(error)
+                    return
+                """The process pool was shut down after breaking, and already replaced"""
+                continue
+            finally:
+                with self.condition:
+                    self.in_flight[bits] -= 1
+            with self.condition:
+                if self.closed:
+                    return
+                if executor is self.executor:
+                    self.untried_replacement = False
+                self.keys[bits].append(key)
+                self.generated[bits] += 1
+                self.generation_time[bits] += time.perf_counter() - started
+                self.dirty = self.path is not None
+                self.condition.notify_all()
+            self.save_changes()
+
+    def replace_executor(self, broken, error):
+        """
+        Starts a new process pool in place of broken, unless another refill thread already did; if broken was
+        itself a replacement that never generated a key, gives up and fails the pool with error
+        """
+        with self.condition:
+            if self.closed or self.executor is not broken:
+                return
+            if self.untried_replacement:
+                self.failure = error
+            else:
+                self.executor = concurrent.futures.ProcessPoolExecutor(self.workers)
+                self.untried_replacement = True
+            self.condition.notify_all()
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def fail(self, error):
+        """Stops key generation, waking the threads waiting for keys so that they raise"""
+        with self.condition:
+            if self.failure is None:
+                self.failure = error
+            self.condition.notify_all()
+
+    def fill(self, timeout=None):
+        """Waits until every size has depth keys ready, returns False on timeout; raises if generation stopped"""
+        with self.condition:
+            filled = self.condition.wait_for(
+                lambda: self.closed or self.failure or all(len(keys) >= self.depth for keys in self.keys.values()),
+                timeout)
+            if not self.closed:
+                self.check_failure()
+            return filled
+
+    def stats(self):
+        """Per bit size: keys ready and being generated, keys generated and served, waits and refill rates"""
+        with self.condition:
+            elapsed = time.perf_counter() - self.started
+            return {bits: {"ready": len(keys),
+                           "depth": self.depth,
+                           "in_flight": self.in_flight[bits],
+                           "generated": self.generated[bits],
+                           "served": self.served[bits],
+                           "waits": self.waits[bits],
+                           "refill_rate": self.generated[bits] / elapsed if elapsed else 0.0,
+                           "generation_s": self.generation_time[bits] / self.generated[bits]
+                           if self.generated[bits] else None}
+                    for bits, keys in self.keys.items()}
+
+    def load(self):
+        """Adds the keys saved at self.path with this pool's exponent"""
+        with open(self.path, 'r') as file:
+            saved = json.load(file)
+        for bits, keys in saved.items():
+            pool = self.keys.setdefault(int(bits), collections.deque())
+            pool.extend(tuple(key) for key in keys if key[1] == self.e)
+
+    def save_changes(self):
+        """Writes the ready keys to self.path if they changed since the last save"""
+        with self.save_lock:
+            with self.condition:
+                if not self.dirty:
+                    return
+                self.dirty = False
+                saved = {str(bits): list(keys) for bits, keys in self.keys.items()}
+            temporary = self.path + ".tmp"
+            """A leftover file may be readable by others, or a link; O_EXCL creates a new one"""
+            try:
+                os.unlink(temporary)
+            except FileNotFoundError:
+                pass
+            with os.fdopen(os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), 'w') as file:
+                json.dump(saved, file)
+            os.replace(temporary, self.path)
+
+    def close(self):
+        """Stops refilling and saves the ready keys; keys still being generated are dropped"""
+        with self.condition:
+            if self.closed:
+                return
+            self.closed = True
+            self.condition.notify_all()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+        if self.path is not None:
+            with self.condition:
+                self.dirty = True
+            self.save_changes()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
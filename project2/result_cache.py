@@ -0,0 +1,128 @@
+"""Cache of recovered keys, so that hacking the same intercept again is a lookup"""
+import collections
+import hashlib
+import json
+import sqlite3
+import threading
+
+"""Entries kept in memory before the least recently used one is evicted"""
+DEFAULT_MAX_ENTRIES = 1024
+
+
+def fingerprint(cipher_name, alphabet, text, mode=""):
+    """
+    Identifies a hack by the cipher type, the alphabet and its unknown policy, the ciphertext and the search mode
+    (scorer and flags), hashing the alphabet and the text with sha256 so that long intercepts make short keys. A
+    plain list of symbols has the policy of Alphabet(symbols), drop.
+    """
+    unknown = getattr(alphabet, "unknown", "drop")
+    alphabet_hash = hashlib.sha256("".join(alphabet).encode('utf_8', 'surrogatepass')).hexdigest()
+    text_hash = hashlib.sha256(text.encode('utf_8', 'surrogatepass')).hexdigest()
+    return "%s:%s:%s:%s:%s" % (cipher_name, mode, unknown, alphabet_hash, text_hash)
+
+
+def encode_key(key):
+    """Cipher key as JSON text for the disk store; Affine (shift, multiplier) tuples become lists"""
+    return json.dumps(key)
+
+
+def decode_key(text):
+    """Inverse of encode_key, turning lists back into tuples"""
+    key = json.loads(text)
+    return tuple(key) if isinstance(key, list) else key
+
+
+class ResultCache:
+    """
+    Bounded LRU of fingerprint -> (key, score), optionally backed by an SQLite file that keeps every result across
+    runs. Memory misses fall through to the file and promote what they find. Safe to share between threads.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, path=None):
+        if max_entries < 1:
+            raise ValueError("A result cache needs room for at least one entry")
+        self.max_entries = max_entries
+        self.path = path
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        self.connection = None
+        if path is not None:
+            self.connection = sqlite3.connect(path, check_same_thread=False)
+            with self.connection:
+                self.connection.execute("CREATE TABLE IF NOT EXISTS results "
+                                        "(fingerprint TEXT PRIMARY KEY, key TEXT, score REAL)")
+
+    def get(self, fingerprint):
+        """(key, score) stored for fingerprint, or None"""
+        with self.lock:
+            entry = self.entries.get(fingerprint)
+            if entry is not None:
+                self.entries.move_to_end(fingerprint)
+                self.hits += 1
+                return entry
+            if self.connection is not None:
+                row = self.connection.execute("SELECT key, score FROM results WHERE fingerprint = ?",
+                                              (fingerprint,)).fetchone()
+                if row is not None:
+                    entry = (decode_key(row[0]), row[1])
+                    self.remember(fingerprint, entry)
+                    self.disk_hits += 1
+                    return entry
+            self.misses += 1
+            return None
+
+    def put(self, fingerprint, key, score):
+        """Stores the winning key and its score"""
+        with self.lock:
+            self.remember(fingerprint, (key, score))
+            if self.connection is not None:
+                with self.connection:
+                    self.connection.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?)",
+                                            (fingerprint, encode_key(key), score))
+
+    def remember(self, fingerprint, entry):
+        """Adds entry to the in-memory LRU, evicting the oldest entries past max_entries"""
+        self.entries[fingerprint] = entry
+        self.entries.move_to_end(fingerprint)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        """Hit, miss and eviction counts; hits include disk_hits"""
+        with self.lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {"hits": self.hits + self.disk_hits,
+                    "disk_hits": self.disk_hits,
+                    "misses": self.misses,
+                    "evictions": self.evictions,
+                    "entries": len(self.entries),
+                    "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0}
+
+    def clear(self):
+        """Forgets every result, in memory and on disk"""
+        with self.lock:
+            self.entries.clear()
+            if self.connection is not None:
+                with self.connection:
+                    self.connection.execute("DELETE FROM results")
+
+    def close(self):
+        """Closes the disk store; the in-memory entries stay usable"""
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
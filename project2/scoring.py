@@ -0,0 +1,170 @@
+"""Pluggable scorers telling the Hacker how English a candidate plaintext looks"""
+import math
+import threading
+from array import array
+from collections import Counter
+
+import instrumentation
+import word_list
+
+"""n-gram symbols: the letters, space, and one class for everything else"""
+NGRAM_LETTERS = "abcdefghijklmnopqrstuvwxyz"
+NGRAM_SPACE = len(NGRAM_LETTERS)
+NGRAM_OTHER = NGRAM_SPACE + 1
+NGRAM_SYMBOLS = NGRAM_OTHER + 1
+
+"""Average log10 probability per character that reads as English, between English text and shuffled letters"""
+NGRAM_ACCEPTANCE = {2: -2.9, 3: -4.3, 4: -5.8}
+
+_ngram_tables = {}
+_lock = threading.Lock()
+
+
+class DictionaryScorer:
+    """Scores a text by how many of its space separated words are in the dictionary"""
+
+    incremental = False
+
+    def __init__(self, english_words=None):
+        self.english_words = word_list.load_english_words() if english_words is None else english_words
+
+    def get_name(self):
+        return "Dictionary"
+
+    def score(self, text):
+        words = text.split(" ")
+        if instrumentation.enabled:
+            instrumentation.count("dictionary_lookups", len(words))
+        word_count = 0
+        for decoded_word in words:
+            if decoded_word.lower().replace(".", "") in self.english_words:
+                word_count += 1
+        return word_count
+
+    def score_decoding(self, cipher, text, bound=None):
+        """Score of cipher.decode(text); a word count can still grow, so this never aborts"""
+        return self.score(cipher.decode(text))
+
+    def threshold(self, text):
+        """A score good enough to stop searching"""
+        return len(text) / 5
+
+    def accepts(self, score, text):
+        """True if at least half of the words are English"""
+        return score > 0 and score * 2 >= len(text.split(" "))
+
+
+class _CodeTable(dict):
+    """str.translate table sending every character without an n-gram symbol to NGRAM_OTHER"""
+
+    def __missing__(self, key):
+        return NGRAM_OTHER
+
+
+class NgramScorer:
+    """
+    Scores a text by its log10 probability under an n-gram model of English words (n = 2 for bigrams, 4 for
+    quadgrams). The counts come from english_words.txt, each word padded with spaces, and are stored as one flat
+    array indexed by the n symbols read as a number in base NGRAM_SYMBOLS.
+    """
+
+    incremental = True
+
+    def __init__(self, n=4, chunk_size=256, acceptance=None, abort_margin=0.5):
+        self.n = n
+        self.chunk_size = chunk_size
+        self.acceptance = NGRAM_ACCEPTANCE.get(n, -6.0) if acceptance is None else acceptance
+        self.abort_margin = abort_margin
+        self.size = NGRAM_SYMBOLS ** n
+        self.table = ngram_table(n)
+        self.codes = _CodeTable({ord(letter): index for index, letter in enumerate(NGRAM_LETTERS)})
+        for index, letter in enumerate(NGRAM_LETTERS.upper()):
+            self.codes[ord(letter)] = index
+        self.codes[ord(" ")] = NGRAM_SPACE
+
+    def __reduce__(self):
+        """Process pool workers use their own (or the forked) table instead of unpickling a copy"""
+        return NgramScorer, (self.n, self.chunk_size, self.acceptance, self.abort_margin)
+
+    def get_name(self):
+        return "Ngram%d" % self.n
+
+    def start(self):
+        """Rolling n-gram index before the first character, as if the text followed spaces"""
+        index = 0
+        for _ in range(self.n - 1):
+            index = index * NGRAM_SYMBOLS + NGRAM_SPACE
+        return index
+
+    def extend(self, total, index, text):
+        """Adds the log probabilities of text continuing from the rolling index, returns (total, index)"""
+        table = self.table
+        size = self.size
+        if instrumentation.enabled:
+            instrumentation.count("ngram_lookups", len(text))
+        for code in text.translate(self.codes).encode('latin_1'):
+            index = (index * NGRAM_SYMBOLS + code) % size
+            total += table[index]
+        return total, index
+
+    def score(self, text):
+        return self.extend(0.0, self.start(), text)[0]
+
+    def score_decoding(self, cipher, text, bound=None):
+        """
+        Decodes and scores text chunk by chunk, returning None as soon as the key is out of the running.
+        Every n-gram adds a negative log probability, so a running total below bound can never win. With an
+        abort_margin the key is also dropped once its average per character is abort_margin below the average of
+        bound, the best total so far; English and gibberish differ by more than 1 per character, so a wrong key is
+        usually dropped after its first chunk. Set abort_margin to None for the exact search.
+        """
+        total, index = 0.0, self.start()
+        for position in range(0, len(text), self.chunk_size):
+            chunk = text[position:position + self.chunk_size]
+            total, index = self.extend(total, index, cipher.decode_chunk(chunk, position))
+            if bound is None:
+                continue
+            if total < bound:
+                return None
+            decoded = position + len(chunk)
+            if self.abort_margin is not None and total < (bound / len(text) - self.abort_margin) * decoded:
+                return None
+        return total
+
+    def threshold(self, text):
+        """Probabilities never get good enough to stop early"""
+        return None
+
+    def accepts(self, score, text):
+        """True if the average log10 probability per character is at least self.acceptance"""
+        return len(text) > 0 and score / len(text) >= self.acceptance
+
+
+def ngram_table(n):
+    """Log10 n-gram probabilities from the English word list, built once per process for each n"""
+    table = _ngram_tables.get(n)
+    if table is None:
+        with _lock:
+            table = _ngram_tables.get(n)
+            if table is None:
+                table = _ngram_tables[n] = _build_ngram_table(n)
+    return table
+
+
+def _build_ngram_table(n):
+    """Counts the n-grams of the dictionary words, each padded with n - 1 spaces, with add-one smoothing"""
+    size = NGRAM_SYMBOLS ** n
+    codes = _CodeTable({ord(letter): index for index, letter in enumerate(NGRAM_LETTERS)})
+    codes[ord(" ")] = NGRAM_SPACE
+    padding = " " * (n - 1)
+    symbols = (padding + padding.join(word_list.load_english_words()) + padding).translate(codes).encode('latin_1')
+    counts = Counter(zip(*(symbols[offset:] for offset in range(n))))
+    total = sum(counts.values())
+
+    logarithms = array('d', [math.log10(1 / (total + size))]) * size
+    for ngram, count in counts.items():
+        index = 0
+        for code in ngram:
+            index = index * NGRAM_SYMBOLS + code
+        logarithms[index] = math.log10((count + 1) / (total + size))
+    return logarithms
@@ -0,0 +1,147 @@
+"""Optional NumPy backend running the ciphers as modular arithmetic on alphabet index arrays"""
+import crypto_utils
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+"""Upper bound on keys x characters decoded in one 2-D pass"""
+MAX_BATCH_ELEMENTS = 1 << 22
+
+"""Above this many characters str.translate per key beats one 2-D pass over every key"""
+MAX_TEXT_LENGTH = 4000
+
+
+def available():
+    """True if NumPy is installed"""
+    return np is not None
+
+
+def code_points(text):
+    """The text as an array of unicode code points"""
+    return np.frombuffer(text.encode('utf_32_le'), dtype='<u4')
+
+
+def unknown_policy(alphabet):
+    """The alphabet's policy for characters outside it; plain lists drop them"""
+    return getattr(alphabet, "unknown", "drop")
+
+
+def to_indices(text, alphabet):
+    """Alphabet index of every character in text, with -1 for characters outside the alphabet"""
+    symbols = code_points("".join(alphabet))
+    lookup = np.full(int(symbols.max()) + 2, -1, dtype=np.int64)
+    lookup[symbols] = np.arange(len(alphabet))
+    codes = code_points(text)
+    indices = lookup[np.minimum(codes, len(lookup) - 1)]
+    if unknown_policy(alphabet) == "error" and (indices < 0).any():
+        raise ValueError("%r is not in the alphabet" % text[int(np.argmax(indices < 0))])
+    return indices
+
+
+def from_indices(indices, alphabet, text=None):
+    """
+    Maps an index array back to text. The -1 entries are dropped like the string ciphers do, or, when the
+    alphabet keeps unknown characters, taken from the original text.
+    """
+    symbols = code_points("".join(alphabet))
+    if text is not None and unknown_policy(alphabet) == "keep":
+        return np.where(indices >= 0, symbols[indices], code_points(text)).astype('<u4').tobytes().decode('utf_32_le')
+    return symbols[indices[indices >= 0]].tobytes().decode('utf_32_le')
+
+
+def inverse_of(alphabet, multiplier):
+    """Multiplicative inverse mod len(alphabet), from the Alphabet's cache when it has one"""
+    if hasattr(alphabet, "inverse"):
+        return alphabet.inverse(multiplier)
+    return crypto_utils.modular_inverse(multiplier, len(alphabet))
+
+
+def _keystream(keyword, alphabet, length):
+    """Unbreakable shifts for <length> characters, the keyword tiled with np.resize"""
+    positions = getattr(alphabet, "indices", None) or {letter: index for index, letter in enumerate(alphabet)}
+    shifts = np.array([positions[letter] for letter in keyword if letter in positions], dtype=np.int64)
+    return np.resize(shifts, length)
+
+
+def encode_indices(cipher, indices):
+    """Encodes an index array with a Caesar, Multiplication, Affine or Unbreakable cipher"""
+    size = len(cipher.alphabet)
+    name = cipher.get_name()
+    if name == "Caesar":
+        encoded = (indices + cipher.integer) % size
+    elif name == "Multiplication":
+        encoded = (indices * cipher.integer) % size
+    elif name == "Affine":
+        encoded = ((indices + cipher.integers[0]) * cipher.integers[1]) % size
+    elif name == "Unbreakable":
+        encoded = (indices + _keystream(cipher.keyword, cipher.alphabet, len(indices))) % size
+    else:
+        raise ValueError("No vectorized kernel for " + name)
+    return np.where(indices >= 0, encoded, -1)
+
+
+def decode_indices(cipher, indices):
+    """Decodes an index array with a Caesar, Multiplication, Affine or Unbreakable cipher"""
+    size = len(cipher.alphabet)
+    name = cipher.get_name()
+    if name == "Caesar":
+        decoded = (indices - cipher.integer) % size
+    elif name == "Multiplication":
+        decoded = (indices * inverse_of(cipher.alphabet, cipher.integer)) % size
+    elif name == "Affine":
+        inverse = inverse_of(cipher.alphabet, cipher.integers[1])
+        decoded = (indices * inverse - cipher.integers[0]) % size
+    elif name == "Unbreakable":
+        decoded = (indices - _keystream(cipher.keyword, cipher.alphabet, len(indices))) % size
+    else:
+        raise ValueError("No vectorized kernel for " + name)
+    return np.where(indices >= 0, decoded, -1)
+
+
+def encode(cipher, text):
+    """cipher.encode(text) computed on index arrays"""
+    return from_indices(encode_indices(cipher, to_indices(text, cipher.alphabet)), cipher.alphabet, text)
+
+
+def decode(cipher, text):
+    """cipher.decode(text) computed on index arrays"""
+    return from_indices(decode_indices(cipher, to_indices(text, cipher.alphabet)), cipher.alphabet, text)
+
+
+def decode_all_indices(name, alphabet, indices, keys):
+    """
+    Decodes the index array under every key at once, as a (keys x text) array.
+    Keys are shifts for Caesar, multipliers for Multiplication and (shift, multiplier) pairs for Affine.
+    """
+    size = len(alphabet)
+    valid = indices[indices >= 0]
+    if name == "Caesar":
+        shifts = np.asarray(keys, dtype=np.int64)
+        return (valid[None, :] - shifts[:, None]) % size
+    elif name == "Multiplication":
+        inverses = np.array([inverse_of(alphabet, key) for key in keys], dtype=np.int64)
+        return (valid[None, :] * inverses[:, None]) % size
+    elif name == "Affine":
+        shifts = np.array([key[0] for key in keys], dtype=np.int64)
+        inverses = np.array([inverse_of(alphabet, key[1]) for key in keys], dtype=np.int64)
+        return (valid[None, :] * inverses[:, None] - shifts[:, None]) % size
+    raise ValueError("No vectorized kernel for " + name)
+
+
+def decode_all(name, alphabet, text, keys):
+    """Yields text decoded under each key in turn, computing MAX_BATCH_ELEMENTS characters per 2-D pass"""
+    indices = to_indices(text, alphabet)
+    symbols = code_points("".join(alphabet))
+    length = int((indices >= 0).sum())
+    if length == 0:
+        for _ in keys:
+            yield ""
+        return
+    batch = max(1, MAX_BATCH_ELEMENTS // length)
+    for start in range(0, len(keys), batch):
+        matrix = decode_all_indices(name, alphabet, indices, keys[start:start + batch])
+        decoded = symbols[matrix].tobytes().decode('utf_32_le')
+        for row in range(len(matrix)):
+            yield decoded[row * length:(row + 1) * length]
@@ -0,0 +1,237 @@
+"""Process-wide English dictionary shared by every Hacker, in memory or memory-mapped from a compiled file
+
+Compile english_words.txt once with:
+    python word_list.py
+"""
+import bisect
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+
+ENGLISH_WORDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "english_words.txt")
+COMPILED_WORDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "english_words.bin")
+
+"""
+Compiled format: MAGIC and the word count as a little endian uint32, then little endian uint32 arrays of BUCKETS + 1
+bucket starts and count + 1 offsets, then the sorted UTF-8 words back to back. Word i is blob[offsets[i]:offsets[i + 1]]
+and the words whose first two bytes read as the number b are words buckets[b] to buckets[b + 1] - 1.
+"""
+MAGIC = b"WORDLST1"
+HEADER = struct.Struct("<8sI")
+BUCKETS = 1 << 16
+
+_english_words = None
+_mapped_english_words = None
+_lock = threading.Lock()
+
+
+class WordList:
+    """Immutable word list with O(1) membership and the original file order for iteration"""
+
+    def __init__(self, words):
+        self.words = tuple(words)
+        self.index = frozenset(self.words)
+
+    def __reduce__(self):
+        """The shared list pickles as a call to load it, so process pool workers use their own copy"""
+        if self is _english_words:
+            return load_english_words, ()
+        return WordList, (self.words,)
+
+    def __contains__(self, word):
+        return word in self.index
+
+    def __iter__(self):
+        return iter(self.words)
+
+    def __len__(self):
+        return len(self.words)
+
+    def has_prefix(self, prefix):
+        """True if some word starts with prefix; needs words in sorted order, as in english_words.txt"""
+        index = bisect.bisect_left(self.words, prefix)
+        return index < len(self.words) and self.words[index].startswith(prefix)
+
+    def words_with_prefix(self, prefix):
+        """Yields the words starting with prefix; needs words in sorted order, as in english_words.txt"""
+        for index in range(bisect.bisect_left(self.words, prefix), len(self.words)):
+            if not self.words[index].startswith(prefix):
+                return
+            yield self.words[index]
+
+
+class MappedWordList:
+    """
+    Word list answering membership and prefix queries by binary search over a memory-mapped compiled file, so that
+    loading is instant and every process shares the same pages. Iterates in sorted order.
+    """
+
+    def __init__(self, path=COMPILED_WORDS_PATH):
+        self.path = path
+        with open(path, 'rb') as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count = HEADER.unpack_from(self.map)
+        if magic != MAGIC:
+            self.map.close()
+            raise ValueError(path + " is not a compiled word list")
+        offsets_start = HEADER.size + 4 * (BUCKETS + 1)
+        self.blob = offsets_start + 4 * (self.count + 1)
+        self.buckets = self.uint32_array(HEADER.size, offsets_start)
+        self.offsets = self.uint32_array(offsets_start, self.blob)
+
+    def uint32_array(self, start, stop):
+        """The little endian uint32s in map[start:stop], without copying them on little endian machines"""
+        view = memoryview(self.map)[start:stop]
+        if sys.byteorder == "little":
+            return view.cast('I')
+        numbers = array('I', view)
+        numbers.byteswap()
+        view.release()
+        return numbers
+
+    def __reduce__(self):
+        """Process pool workers map the file themselves"""
+        if self is _mapped_english_words:
+            return load_mapped_english_words, ()
+        return MappedWordList, (self.path,)
+
+    @property
+    def words(self):
+        """Indexable like WordList.words, decoding words on access"""
+        return self
+
+    def word_bytes(self, index):
+        return self.map[self.blob + self.offsets[index]:self.blob + self.offsets[index + 1]]
+
+    def search(self, key):
+        """Index of the first word >= key, both as UTF-8 bytes"""
+        if len(key) >= 2:
+            bucket = key[0] << 8 | key[1]
+            low, high = self.buckets[bucket], self.buckets[bucket + 1]
+        elif key:
+            low, high = self.buckets[key[0] << 8], self.buckets[(key[0] + 1) << 8] if key[0] < 255 else self.count
+        else:
+            low, high = 0, self.count
+        words, blob, offsets = self.map, self.blob, self.offsets
+        while low < high:
+            middle = (low + high) // 2
+            if words[blob + offsets[middle]:blob + offsets[middle + 1]] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def __contains__(self, word):
+        try:
+            key = word.encode('utf_8')
+        except (AttributeError, UnicodeEncodeError):
+            return False
+        index = self.search(key)
+        return index < self.count and self.word_bytes(index) == key
+
+    def has_prefix(self, prefix):
+        """True if some word starts with prefix"""
+        key = prefix.encode('utf_8', 'surrogatepass')
+        index = self.search(key)
+        return index < self.count and self.word_bytes(index).startswith(key)
+
+    def words_with_prefix(self, prefix):
+        """Yields the words starting with prefix, in sorted order"""
+        key = prefix.encode('utf_8', 'surrogatepass')
+        for index in range(self.search(key), self.count):
+            word = self.word_bytes(index)
+            if not word.startswith(key):
+                return
+            yield word.decode('utf_8')
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[position] for position in range(*index.indices(self.count))]
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("word index out of range")
+        return self.word_bytes(index).decode('utf_8')
+
+    def __iter__(self):
+        for index in range(self.count):
+            yield self.word_bytes(index).decode('utf_8')
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        for numbers in (self.buckets, self.offsets):
+            if isinstance(numbers, memoryview):
+                numbers.release()
+        self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def compile_word_list(source=ENGLISH_WORDS_PATH, destination=COMPILED_WORDS_PATH):
+    """Compiles a whitespace separated word list into the sorted, memory-mappable format of MappedWordList"""
+    with open(source, 'r') as file:
+        words = sorted(set(word.encode('utf_8') for word in file.read().split()))
+    offsets = array('I', [0])
+    buckets = array('I', [0]) * (BUCKETS + 1)
+    for word in words:
+        offsets.append(offsets[-1] + len(word))
+        """Counts the words per bucket, a one byte word being in the bucket of its byte followed by 0"""
+        buckets[(word[0] << 8 | (word[1] if len(word) > 1 else 0)) + 1] += 1
+    for bucket in range(BUCKETS):
+        buckets[bucket + 1] += buckets[bucket]
+    if sys.byteorder != "little":
+        buckets.byteswap()
+        offsets.byteswap()
+    temporary = destination + ".tmp"
+    with open(temporary, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, len(words)))
+        file.write(buckets.tobytes())
+        file.write(offsets.tobytes())
+        file.write(b"".join(words))
+    os.replace(temporary, destination)
+    return destination
+
+
+def read_word_list(path):
+    """Reads a whitespace separated word list from disk"""
+    with open(path, 'r') as file:
+        return WordList(file.read().split())
+
+
+def load_english_words():
+    """Returns the shared English WordList, reading english_words.txt on first use only"""
+    global _english_words
+    if _english_words is None:
+        with _lock:
+            if _english_words is None:
+                _english_words = read_word_list(ENGLISH_WORDS_PATH)
+    return _english_words
+
+
+def load_mapped_english_words():
+    """
+    Returns the shared MappedWordList of english_words.txt, compiling english_words.bin first if it is missing or
+    older than the text file. english_words.txt is sorted, so it iterates in the same order as load_english_words().
+    """
+    global _mapped_english_words
+    if _mapped_english_words is None:
+        with _lock:
+            if _mapped_english_words is None:
+                if not os.path.exists(COMPILED_WORDS_PATH) or \
+                        os.path.getmtime(COMPILED_WORDS_PATH) < os.path.getmtime(ENGLISH_WORDS_PATH):
+                    compile_word_list()
+                _mapped_english_words = MappedWordList(COMPILED_WORDS_PATH)
+    return _mapped_english_words
+
+
+if __name__ == "__main__":
+    print("Compiled", compile_word_list())